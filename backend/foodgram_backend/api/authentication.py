@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.authentication import TokenAuthentication
+
+from .caches import is_shared_cache
+
+# Сколько секунд после отзыва токена его нельзя снова положить в кэш:
+# запрос, прочитавший токен до отзыва, не вернет его туда.
+REVOKED_TIMEOUT = 10
+
+
+def get_auth_cache():
+    return caches[settings.AUTH_TOKEN_CACHE_ALIAS]
+
+
+def get_cache_timeout():
+    """
+    Время хранения токена в кэше. Отзыв токена в кэше одного процесса
+    не дойдет до других воркеров, поэтому с ним токены не кэшируются.
+    """
+    if not is_shared_cache(settings.AUTH_TOKEN_CACHE_ALIAS):
+        return 0
+    return settings.AUTH_TOKEN_CACHE_TIMEOUT
+
+
+def get_token_key(key):
+    return f'auth_token:{key}'
+
+
+def revoke_cached_tokens(keys):
+    """Убирает токены из кэша сразу и еще раз после фиксации транзакции."""
+    keys = [get_token_key(key) for key in keys]
+    if not keys:
+        return
+
+    def revoke():
+        get_auth_cache().set_many(
+            {key: False for key in keys}, REVOKED_TIMEOUT)
+
+    revoke()
+    transaction.on_commit(revoke)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication, который хранит токен вместе с пользователем
+    в кэше AUTH_TOKEN_CACHE_TIMEOUT секунд вместо запроса к базе
+    на каждый запрос к API.
+    """
+
+    def authenticate_credentials(self, key):
+        timeout = get_cache_timeout()
+        if not timeout:
+            return super().authenticate_credentials(key)
+        cache = get_auth_cache()
+        token = cache.get(get_token_key(key))
+        if token:
+            return token.user, token
+        user, token = super().authenticate_credentials(key)
+        cache.add(get_token_key(key), token, timeout)
+        return user, token
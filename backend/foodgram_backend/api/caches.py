@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+)
+
+
+def is_shared_cache(alias=DEFAULT_CACHE_ALIAS):
+    """
+    Виден ли кэш всем процессам gunicorn. Записи в LocMemCache остаются
+    в одном процессе, поэтому сбросы и отметки, сделанные в нем, другие
+    воркеры не увидят.
+    """
+    return settings.CACHES[alias]['BACKEND'] not in PROCESS_LOCAL_BACKENDS
+
+
+def clear_data_caches():
+    """
+    Очищает кэши после загрузки данных в обход сигналов. Фрагменты
+    рецептов, отметки пользователей и токены, закэшированные по id
+    прежней базы, иначе отдавались бы для новых строк с теми же id.
+    """
+    for alias in {
+            DEFAULT_CACHE_ALIAS, settings.CATALOG_CACHE_ALIAS,
+            settings.AUTH_TOKEN_CACHE_ALIAS}:
+        caches[alias].clear()
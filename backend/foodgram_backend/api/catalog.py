@@ -0,0 +1,120 @@
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from recipes.models import Tag
+from .replicas import read_from_primary
+
+
+def get_catalog_cache():
+    return caches[settings.CATALOG_CACHE_ALIAS]
+
+
+def get_version_key(catalog):
+    return f'catalog_version:{catalog}'
+
+
+def get_catalog_version(catalog):
+    """Текущий номер версии справочника."""
+    return get_catalog_cache().get(get_version_key(catalog), 0)
+
+
+def bump_catalog_version(catalog):
+    """
+    Делает устаревшими все закэшированные данные справочника. Пропавшая
+    из кэша версия начинается с текущего времени в мс, а не с 1, чтобы
+    после очистки кэша не вернуться к версии, которую процессы уже видели.
+    """
+    cache = get_catalog_cache()
+    try:
+        cache.incr(get_version_key(catalog))
+    except ValueError:
+        cache.set(get_version_key(catalog), int(time.time() * 1000), None)
+
+
+def get_tag_ids():
+    """Словарь {slug: id} всех тегов из кэша справочника."""
+    key = 'catalog:tags:{}:ids'.format(get_catalog_version('tags'))
+    tag_ids = get_catalog_cache().get(key)
+    if tag_ids is None:
+        with read_from_primary():
+            tag_ids = dict(Tag.objects.values_list('slug', 'id'))
+        get_catalog_cache().set(key, tag_ids, settings.CATALOG_CACHE_TIMEOUT)
+    return tag_ids
+
+
+def get_tag_choices():
+    return [(slug, slug) for slug in get_tag_ids()]
+
+
+def etag_matches(etag, header):
+    """
+    Совпадает ли ETag со списком из If-None-Match: '*' подходит к любому,
+    остальные теги сравниваются целиком без учета признака W/.
+    """
+    tags = parse_etags(header)
+    return '*' in tags or etag in (
+        tag[2:] if tag.startswith('W/') else tag for tag in tags)
+
+
+class CatalogCacheMixin:
+    """
+    Кэширует ответы справочника до изменения его версии,
+    отдает сильный ETag и отвечает 304 на совпавший If-None-Match.
+    Ключ кэша строится только из параметров cache_params, поэтому
+    посторонние параметры запроса не плодят записи.
+    """
+    catalog = None
+    cache_params = ()
+
+    def get_cache_params(self, request):
+        return [
+            request.query_params.get(param, '')
+            for param in self.cache_params
+        ]
+
+    def get_cache_key(self, request, kwargs):
+        params = json.dumps(
+            [self.action, kwargs, self.get_cache_params(request)],
+            ensure_ascii=False, sort_keys=True)
+        return 'catalog:{}:{}:{}'.format(
+            self.catalog, get_catalog_version(self.catalog),
+            hashlib.md5(params.encode()).hexdigest())
+
+    def get_cached_response(self, request, view, *args, **kwargs):
+        cache = get_catalog_cache()
+        key = self.get_cache_key(request, kwargs)
+        cached = cache.get(key)
+        if cached is None:
+            with read_from_primary():
+                response = view(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            content = json.dumps(
+                response.data, ensure_ascii=False, sort_keys=True)
+            etag = '"{}"'.format(
+                hashlib.md5(content.encode()).hexdigest())
+            cached = (etag, response.data)
+            cache.set(key, cached, settings.CATALOG_CACHE_TIMEOUT)
+        etag, data = cached
+        if etag_matches(etag, request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(data)
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            request, super().retrieve, *args, **kwargs)
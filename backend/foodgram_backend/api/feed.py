@@ -0,0 +1,93 @@
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import Q
+
+from recipes.models import FeedEntry, Recipe
+from users.models import Subscription, User
+
+
+def get_names(connection, model, *fields):
+    """Имя таблицы и столбцов модели для сырого SQL."""
+    quote = connection.ops.quote_name
+    return [quote(model._meta.db_table)] + [
+        quote(model._meta.get_field(field).column) for field in fields]
+
+
+def execute(sql, params=()):
+    connection = connections[router.db_for_write(FeedEntry)]
+    feed = get_names(connection, FeedEntry, 'user', 'recipe', 'author')
+    subscription = get_names(connection, Subscription, 'user', 'author')
+    recipe = get_names(connection, Recipe, 'id', 'author')
+    user = get_names(connection, User, 'id', 'subscribers_count')
+    with connection.cursor() as cursor:
+        cursor.execute(sql.format(
+            feed=feed, subscription=subscription, recipe=recipe, user=user),
+            params)
+
+
+def fan_out_recipe(recipe):
+    """
+    Добавляет новый рецепт в ленты подписчиков автора одним
+    INSERT ... SELECT. Рецепты популярных авторов в ленты не копируются,
+    их лента подмешивает при чтении.
+    """
+    if User.objects.filter(
+            id=recipe.author_id,
+            subscribers_count__gt=settings.FEED_FANOUT_LIMIT).exists():
+        return
+    execute(
+        'INSERT INTO {feed[0]} ({feed[1]}, {feed[2]}, {feed[3]}) '
+        'SELECT {subscription[1]}, %s, %s FROM {subscription[0]} '
+        'WHERE {subscription[2]} = %s ON CONFLICT DO NOTHING',
+        [recipe.id, recipe.author_id, recipe.author_id])
+
+
+def backfill_feed(user_id, author_ids):
+    """Добавляет в ленту последние рецепты новых авторов подписки."""
+    entries = []
+    for author_id in User.objects.filter(
+            id__in=author_ids,
+            subscribers_count__lte=settings.FEED_FANOUT_LIMIT
+    ).values_list('id', flat=True):
+        entries.extend(
+            FeedEntry(
+                user_id=user_id, recipe_id=recipe_id, author_id=author_id)
+            for recipe_id in Recipe.objects.filter(
+                author_id=author_id).order_by('-id').values_list(
+                    'id', flat=True)[:settings.FEED_BACKFILL_SIZE])
+    FeedEntry.objects.bulk_create(entries, ignore_conflicts=True)
+
+
+def trim_feed(user_id, author_ids):
+    """Убирает из ленты рецепты авторов, от которых пользователь отписался."""
+    FeedEntry.objects.filter(
+        user_id=user_id, author_id__in=author_ids).delete()
+
+
+def get_feed_filter(user):
+    """
+    Условие на рецепты ленты: записи ленты пользователя и рецепты
+    популярных авторов подписки, которые в ленты не копируются.
+    """
+    feed = Q(id__in=FeedEntry.objects.filter(user=user).values('recipe_id'))
+    popular = list(Subscription.objects.filter(
+        user=user, author__subscribers_count__gt=settings.FEED_FANOUT_LIMIT
+    ).values_list('author_id', flat=True))
+    if popular:
+        feed |= Q(author_id__in=popular)
+    return feed
+
+
+def rebuild_feeds():
+    """Полностью пересобирает ленты по текущим подпискам."""
+    FeedEntry.objects.all().delete()
+    execute(
+        'INSERT INTO {feed[0]} ({feed[1]}, {feed[2]}, {feed[3]}) '
+        'SELECT {subscription[0]}.{subscription[1]}, {recipe[0]}.{recipe[1]}, '
+        '{recipe[0]}.{recipe[2]} FROM {subscription[0]} '
+        'INNER JOIN {recipe[0]} '
+        'ON {recipe[0]}.{recipe[2]} = {subscription[0]}.{subscription[2]} '
+        'INNER JOIN {user[0]} '
+        'ON {user[0]}.{user[1]} = {subscription[0]}.{subscription[2]} '
+        'WHERE {user[0]}.{user[2]} <= %s',
+        [settings.FEED_FANOUT_LIMIT])
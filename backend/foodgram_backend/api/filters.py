@@ -1,35 +1,58 @@
+from django.db.models import F
 from django_filters.rest_framework import FilterSet, filters
-from rest_framework.filters import SearchFilter
 
 from users.models import User
-from recipes.models import Recipe
-
-
-class IngredientSearchFilter(SearchFilter):
-    """Класс для поиска ингредиентов по названию."""
-    search_param = 'name'
+from recipes.models import (
+    MAX_MASK_TAG_ID, Favorite, Recipe, ShoppingCart, get_tag_mask)
+from .catalog import get_tag_choices, get_tag_ids
+from .search import search_recipes
 
 
 class RecipeFilter(FilterSet):
     """Класс-фильтр выдачи по рецептам."""
-    tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
+    tags = filters.MultipleChoiceFilter(
+        choices=get_tag_choices, method='filter_tags')
     author = filters.ModelChoiceFilter(queryset=User.objects.all())
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart')
+    search = filters.CharFilter(method='filter_search')
+
+    def filter_tags(self, queryset, name, value):
+        """
+        Метод фильтрации по тегам через битовую маску рецепта. Условие
+        на tag_mask & маска не использует индексы и проверяется для
+        каждого рецепта при обходе по -id, зато без соединения с тегами
+        и DISTINCT. В маску помещаются только теги с id не больше
+        MAX_MASK_TAG_ID (62 бита знакового BIGINT), поэтому при выборе
+        тега с большим id фильтр возвращается к соединению с тегами.
+        """
+        tag_ids = get_tag_ids()
+        selected = [tag_ids[slug] for slug in value]
+        if any(tag_id > MAX_MASK_TAG_ID for tag_id in selected):
+            return queryset.filter(tags__id__in=selected).distinct()
+        return queryset.annotate(
+            selected_tags=F('tag_mask').bitand(get_tag_mask(selected))
+        ).filter(selected_tags__gt=0)
 
     def filter_is_favorited(self, queryset, name, value):
         """Метод фильтрации по избранным рецептам."""
         if self.request.user.is_authenticated and value:
-            return queryset.filter(favorites__user=self.request.user)
+            return queryset.filter(id__in=Favorite.objects.filter(
+                user=self.request.user).values('recipe'))
         return queryset
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         """Метод фильтрации по рецептам из корзины покупок."""
         if self.request.user.is_authenticated and value:
-            return queryset.filter(shoppingcarts__user=self.request.user)
+            return queryset.filter(id__in=ShoppingCart.objects.filter(
+                user=self.request.user).values('recipe'))
         return queryset
 
+    def filter_search(self, queryset, name, value):
+        """Метод полнотекстового поиска по названию и описанию."""
+        return search_recipes(queryset, value)
+
     class Meta:
         model = Recipe
         fields = ('tags', 'author')
@@ -0,0 +1,142 @@
+import time
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+LOCK_POLL_INTERVAL = 0.05
+
+
+def get_fragment_key(recipe_id):
+    return f'recipe_fragment:{recipe_id}'
+
+
+def get_lock_key(recipe_id):
+    return f'recipe_fragment_lock:{recipe_id}'
+
+
+def get_recipe_version_key(recipe_id):
+    return f'recipe_fragment_version:{recipe_id}'
+
+
+def get_author_version_key(author_id):
+    return f'author_fragment_version:{author_id}'
+
+
+def bump_versions(keys):
+    keys = list(keys)
+    if keys:
+        transaction.on_commit(lambda: cache.set_many(
+            {key: uuid4().hex for key in keys}, None))
+
+
+def bump_recipe_fragments(recipe_ids):
+    """Делает устаревшими закэшированные фрагменты рецептов."""
+    bump_versions(map(get_recipe_version_key, recipe_ids))
+
+
+def bump_author_fragments(author_ids):
+    """Делает устаревшими фрагменты всех рецептов авторов."""
+    bump_versions(map(get_author_version_key, author_ids))
+
+
+def get_stamps(keys, cached):
+    """
+    Текущие версии из уже прочитанных значений; отсутствующие в кэше
+    версии создаются заново, поэтому старые фрагменты не совпадут с ними.
+    """
+    stamps = {}
+    for key in keys:
+        if key in cached:
+            stamps[key] = cached[key]
+            continue
+        token = uuid4().hex
+        stamps[key] = token if cache.add(key, token, None) else cache.get(key)
+    return stamps
+
+
+class FragmentCache:
+    """
+    Фрагменты рецептов, не зависящие от пользователя, под версиями
+    рецепта и его автора. Промахи по одному рецепту из параллельных
+    запросов строит только тот, кто взял блокировку, остальные
+    ждут его результата.
+    """
+
+    def __init__(self, rows, build):
+        self.build = build
+        self.keys = {
+            row['id']: (
+                get_fragment_key(row['id']),
+                get_recipe_version_key(row['id']),
+                get_author_version_key(row['author_id']),
+            ) for row in rows
+        }
+        self.stamps = {}
+
+    def get_stamp(self, recipe_id):
+        _, recipe_key, author_key = self.keys[recipe_id]
+        return self.stamps[recipe_key], self.stamps[author_key]
+
+    def take_valid(self, recipe_ids, cached, fragments):
+        """Переносит в fragments совпавшие по версии и возвращает прочие."""
+        missing = []
+        for recipe_id in recipe_ids:
+            entry = cached.get(self.keys[recipe_id][0])
+            if entry is not None and entry[0] == self.get_stamp(recipe_id):
+                fragments[recipe_id] = entry[1]
+            else:
+                missing.append(recipe_id)
+        return missing
+
+    def fill(self, recipe_ids, fragments):
+        locked = [
+            recipe_id for recipe_id in recipe_ids
+            if cache.add(
+                get_lock_key(recipe_id), 1,
+                settings.RECIPE_FRAGMENT_LOCK_TIMEOUT)
+        ]
+        waiting = [
+            recipe_id for recipe_id in recipe_ids if recipe_id not in locked]
+        if locked:
+            try:
+                built = self.build(locked)
+                cache.set_many({
+                    self.keys[recipe_id][0]: (
+                        self.get_stamp(recipe_id), fragment)
+                    for recipe_id, fragment in built.items()
+                }, settings.RECIPE_FRAGMENT_CACHE_TIMEOUT)
+                fragments.update(built)
+            finally:
+                cache.delete_many(map(get_lock_key, locked))
+        deadline = time.monotonic() + settings.RECIPE_FRAGMENT_LOCK_WAIT
+        while waiting and time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+            cached = cache.get_many(
+                [self.keys[recipe_id][0] for recipe_id in waiting])
+            waiting = self.take_valid(waiting, cached, fragments)
+        if waiting:
+            fragments.update(self.build(waiting))
+
+    def get_many(self):
+        cached = cache.get_many(
+            {key for keys in self.keys.values() for key in keys})
+        self.stamps = get_stamps(
+            {key for keys in self.keys.values() for key in keys[1:]},
+            cached)
+        fragments = {}
+        missing = self.take_valid(self.keys, cached, fragments)
+        if missing:
+            self.fill(missing, fragments)
+        return fragments
+
+
+def get_recipe_fragments(rows, build):
+    """
+    Фрагменты рецептов {id: фрагмент} для строк с id и author_id.
+    build(recipe_ids) строит недостающие фрагменты из базы.
+    """
+    if not settings.RECIPE_FRAGMENT_CACHE_TIMEOUT:
+        return build([row['id'] for row in rows])
+    return FragmentCache(rows, build).get_many()
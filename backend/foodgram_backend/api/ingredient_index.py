@@ -0,0 +1,99 @@
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+
+from recipes.models import Ingredient
+from .catalog import get_catalog_version
+from .replicas import read_from_primary
+
+NGRAM_SIZE = 3
+
+
+def get_ngrams(text):
+    """Все подстроки названия длиной от 1 до NGRAM_SIZE символов."""
+    return {
+        text[start:start + size]
+        for size in range(1, NGRAM_SIZE + 1)
+        for start in range(len(text) - size + 1)
+    }
+
+
+class IngredientIndex:
+    """
+    Индекс ингредиентов в памяти процесса для поиска по началу названия
+    и по вхождению. Строится лениво при первом запросе и перестраивается,
+    когда меняется версия справочника ингредиентов.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._entries = ([], [], {})
+
+    def _build(self, version):
+        with read_from_primary():
+            rows = sorted(
+                Ingredient.objects.values('id', 'name', 'measurement_unit'),
+                key=lambda row: (row['name'].lower(), row['id']))
+        keys = [row['name'].lower() for row in rows]
+        ngrams = defaultdict(list)
+        for position, key in enumerate(keys):
+            for ngram in get_ngrams(key):
+                ngrams[ngram].append(position)
+        # Потоки читают индекс без блокировки, поэтому ключи, строки
+        # и n-граммы публикуются одним присваиванием.
+        self._entries = (keys, rows, dict(ngrams))
+        self._version = version
+
+    def _get_entries(self):
+        version = get_catalog_version('ingredients')
+        if self._version != version:
+            with self._lock:
+                if self._version != version:
+                    self._build(version)
+        return self._entries
+
+    @staticmethod
+    def _find_containing(entries, query, limit):
+        """
+        Названия, содержащие запрос не с начала. Проверяются только
+        позиции из самого короткого списка n-грамм запроса.
+        """
+        keys, items, ngrams = entries
+        size = min(len(query), NGRAM_SIZE)
+        positions = min(
+            (ngrams.get(query[start:start + size], ())
+             for start in range(len(query) - size + 1)),
+            key=len)
+        result = []
+        for position in positions:
+            key = keys[position]
+            if query in key and not key.startswith(query):
+                result.append(items[position])
+                if len(result) == limit:
+                    break
+        return result
+
+    def search(self, query, limit=None):
+        """
+        Возвращает ингредиенты, подходящие под запрос: сначала точное
+        совпадение и совпадения по началу названия, затем по вхождению.
+        """
+        limit = limit or settings.INGREDIENTS_SEARCH_LIMIT
+        entries = self._get_entries()
+        keys, items, _ = entries
+        query = query.strip().lower()
+        if not query:
+            return items[:limit]
+        start = bisect_left(keys, query)
+        end = bisect_left(keys, query + '\uffff', start)
+        result = items[start:min(end, start + limit)]
+        if len(result) < limit:
+            result += self._find_containing(
+                entries, query, limit - len(result))
+        return result
+
+
+ingredient_index = IngredientIndex()
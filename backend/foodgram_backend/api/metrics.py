@@ -0,0 +1,80 @@
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+
+
+class Histogram:
+    """
+    Гистограмма в формате Prometheus с разбивкой по меткам.
+    Значения накапливаются в памяти процесса.
+    """
+
+    def __init__(self, name, description, buckets):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets))
+        self.lock = threading.Lock()
+        self.series = defaultdict(
+            lambda: [[0] * len(self.buckets), 0, 0])
+
+    def observe(self, labels, value):
+        with self.lock:
+            counts, _, _ = series = self.series[labels]
+            index = bisect_left(self.buckets, value)
+            if index < len(counts):
+                counts[index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [
+            f'# HELP {self.name} {self.description}',
+            f'# TYPE {self.name} histogram',
+        ]
+        with self.lock:
+            series = sorted(
+                (labels, list(counts), total, count)
+                for labels, (counts, total, count) in self.series.items())
+        for labels, counts, total, count in series:
+            label_text = ','.join(
+                f'{key}="{value}"' for key, value in labels)
+            cumulative = 0
+            for bucket, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(
+                    f'{self.name}_bucket{{{label_text},le="{bucket}"}} '
+                    f'{cumulative}')
+            lines.append(
+                f'{self.name}_bucket{{{label_text},le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {total}')
+            lines.append(f'{self.name}_count{{{label_text}}} {count}')
+        return '\n'.join(lines)
+
+
+REQUEST_DURATION = Histogram(
+    'foodgram_request_duration_seconds',
+    'Total request processing time.',
+    settings.METRICS_DURATION_BUCKETS)
+REQUEST_DB_DURATION = Histogram(
+    'foodgram_request_db_duration_seconds',
+    'Time spent in database queries per request.',
+    settings.METRICS_DURATION_BUCKETS)
+REQUEST_DB_QUERIES = Histogram(
+    'foodgram_request_db_queries',
+    'Number of database queries per request.',
+    settings.METRICS_QUERIES_BUCKETS)
+HISTOGRAMS = (REQUEST_DURATION, REQUEST_DB_DURATION, REQUEST_DB_QUERIES)
+
+
+def observe_request(view, method, status, total, db_time, queries):
+    labels = (('method', method), ('status', status), ('view', view))
+    REQUEST_DURATION.observe(labels, total)
+    REQUEST_DB_DURATION.observe(labels, db_time)
+    REQUEST_DB_QUERIES.observe(labels, queries)
+
+
+def render_metrics():
+    """Все гистограммы в текстовом формате Prometheus."""
+    return '\n'.join(histogram.render() for histogram in HISTOGRAMS) + '\n'
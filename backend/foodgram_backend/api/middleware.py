@@ -0,0 +1,181 @@
+import heapq
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from rest_framework.response import Response
+
+from .metrics import observe_request
+
+logger = logging.getLogger(__name__)
+
+
+class QueryTimer:
+    """Обертка выполнения SQL: число запросов, их время и самые долгие."""
+
+    def __init__(self, keep=3):
+        self.keep = keep
+        self.count = 0
+        self.duration = 0
+        self.slowest = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.count += 1
+            self.duration += duration
+            item = (duration, self.count, sql)
+            if len(self.slowest) < self.keep:
+                heapq.heappush(self.slowest, item)
+            else:
+                heapq.heappushpop(self.slowest, item)
+
+
+@contextmanager
+def measure_serialization(request):
+    """
+    Добавляет к request.serialize_time время сборки данных ответа
+    сериализаторами. SQL, выполненный внутри блока, уже учтен в db
+    и из этого времени вычитается.
+    """
+    request = getattr(request, '_request', request)
+    timer = getattr(request, 'query_timer', None)
+    started = time.perf_counter()
+    db_started = timer.duration if timer else 0
+    try:
+        yield
+    finally:
+        if timer:
+            request.serialize_time += (
+                time.perf_counter() - started
+                - (timer.duration - db_started))
+
+
+class SerializeTimingMixin:
+    """
+    list и retrieve, в которых обращение к serializer.data замеряется
+    отдельно от остальной работы представления.
+    """
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        with measure_serialization(request):
+            data = self.get_serializer(
+                queryset if page is None else page, many=True).data
+        if page is None:
+            return Response(data)
+        return self.get_paginated_response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        with measure_serialization(request):
+            data = self.get_serializer(instance).data
+        return Response(data)
+
+
+class PerformanceMiddleware:
+    """
+    Замеряет время запроса, время и число запросов к базе, время
+    сборки данных сериализаторами и отрисовки ответа. Отдает их
+    в заголовке Server-Timing, пишет в лог медленные запросы и копит
+    гистограммы по маршрутам. Потоковый ответ выполняет запросы при
+    отдаче тела, уже после заголовков: Server-Timing покрывает только
+    работу представления, а в гистограммы и лог запрос попадает, когда
+    тело отдано целиком.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        timer = QueryTimer(settings.SLOW_REQUEST_LOGGED_QUERIES)
+        request.query_timer = timer
+        request.serialize_time = 0
+        request.render_time = 0
+        with self.measure_queries(timer):
+            response = self.get_response(request)
+        response['Server-Timing'] = self.get_server_timing(
+            request, time.perf_counter() - started)
+        if response.streaming:
+            response.streaming_content = self.measure_stream(
+                request, response, response.streaming_content, started)
+        else:
+            self.record(request, response, time.perf_counter() - started)
+        return response
+
+    @staticmethod
+    @contextmanager
+    def measure_queries(timer):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            yield
+
+    def measure_stream(self, request, response, content, started):
+        """
+        Отдает тело потокового ответа, учитывая выполненный при этом SQL.
+        Обертка подключается только на время получения очередной части,
+        чтобы не перемешаться с обертками следующих запросов потока.
+        """
+        chunks = iter(content)
+        try:
+            while True:
+                with self.measure_queries(request.query_timer):
+                    chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            self.record(request, response, time.perf_counter() - started)
+
+    @staticmethod
+    def get_server_timing(request, total):
+        timer = request.query_timer
+        view_time = max(
+            total - timer.duration - request.serialize_time
+            - request.render_time, 0)
+        return ', '.join((
+            f'db;dur={timer.duration * 1000:.1f};desc="{timer.count} SQL"',
+            f'view;dur={view_time * 1000:.1f}',
+            f'serialize;dur={request.serialize_time * 1000:.1f}',
+            f'render;dur={request.render_time * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ))
+
+    @staticmethod
+    def record(request, response, total):
+        """Гистограммы по маршруту и запись медленного запроса в лог."""
+        timer = request.query_timer
+        match = request.resolver_match
+        observe_request(
+            match.view_name if match else 'unmatched', request.method,
+            response.status_code, total, timer.duration, timer.count)
+        if (total * 1000 >= settings.SLOW_REQUEST_THRESHOLD
+                or timer.count >= settings.SLOW_REQUEST_QUERIES):
+            logger.warning(
+                'Медленный запрос %s %s: %.1f мс, SQL: %d за %.1f мс, '
+                'сериализация %.1f мс, отрисовка %.1f мс\n%s',
+                request.method, request.get_full_path(), total * 1000,
+                timer.count, timer.duration * 1000,
+                request.serialize_time * 1000, request.render_time * 1000,
+                '\n'.join(
+                    f'{duration * 1000:.1f} мс: {sql}'
+                    for duration, _, sql in sorted(
+                        timer.slowest, reverse=True)))
+
+    def process_template_response(self, request, response):
+        """Время отрисовки ответа DRF (JSONRenderer и т.п.)."""
+        started = time.perf_counter()
+
+        def finish(response):
+            request.render_time = time.perf_counter() - started
+
+        response.add_post_render_callback(finish)
+        return response
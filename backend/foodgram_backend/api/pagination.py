@@ -1,6 +1,74 @@
-from rest_framework.pagination import PageNumberPagination
+import hashlib
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Класс пагинации по ключу: следующая страница выбирается условием
+    на id, поэтому дальние страницы не дороже первой.
+    """
+    ordering = '-id'
+    page_size = settings.PAGE_SIZE
+    page_size_query_param = 'limit'
+    count = None
+
+    def get_count(self, queryset):
+        """Общее число объектов, закэшированное на короткое время."""
+        timeout = settings.PAGINATION_COUNT_CACHE_TIMEOUT
+        if not timeout:
+            return None
+        key = 'pagination_count:' + hashlib.md5(
+            str(queryset.query).encode()).hexdigest()
+        return cache.get_or_set(key, queryset.count, timeout)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = self.get_count(queryset)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict((
+            ('count', self.count),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        )))
+
+
+class FeedPagination(KeysetPagination):
+    """
+    Пагинация ленты подписок по ключу без общего числа записей:
+    оно меняется при каждой подписке и публикации.
+    """
+
+    def get_count(self, queryset):
+        return None
 
 
 class PageLimitPagination(PageNumberPagination):
-    page_size = 6
+    """
+    Класс постраничной пагинации. При наличии параметра cursor
+    в запросе переключается на пагинацию по ключу, если выдача не
+    отсортирована явно: порядок по -id заменил бы сортировку
+    по релевантности при поиске.
+    """
+    page_size = settings.PAGE_SIZE
     page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    keyset = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if (self.cursor_query_param in request.query_params
+                and not queryset.query.order_by):
+            self.keyset = KeysetPagination()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,109 @@
+from django.db import connections, router, transaction
+from django.db.models import F
+
+from recipes.models import Recipe, ShoppingCart
+from users.models import Subscription, User
+from . import shopping_list
+from .feed import backfill_feed, trim_feed
+from .viewer_state import invalidate_viewer_state
+
+
+def get_columns(model, field):
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    return (
+        connection,
+        quote(model._meta.db_table),
+        quote(model._meta.get_field('user').column),
+        quote(model._meta.get_field(field).column),
+    )
+
+
+def insert_relations(model, field, user_id, target_ids):
+    """
+    Создает связи пользователя одним INSERT ... ON CONFLICT DO NOTHING
+    и возвращает id целей, связи с которыми действительно добавлены.
+    """
+    target_ids = sorted(set(target_ids))
+    if not target_ids:
+        return []
+    connection, table, user_column, column = get_columns(model, field)
+    values = ', '.join(['(%s, %s)'] * len(target_ids))
+    params = [
+        value for target_id in target_ids for value in (user_id, target_id)]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ({user_column}, {column}) '
+            f'VALUES {values} ON CONFLICT DO NOTHING RETURNING {column}',
+            params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def delete_relations(model, field, user_id, target_ids):
+    """Удаляет связи одним DELETE и возвращает id затронутых целей."""
+    target_ids = sorted(set(target_ids))
+    if not target_ids:
+        return []
+    connection, table, user_column, column = get_columns(model, field)
+    placeholders = ', '.join(['%s'] * len(target_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE {user_column} = %s '
+            f'AND {column} IN ({placeholders}) RETURNING {column}',
+            [user_id, *target_ids])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def add_recipes(model, user, recipe_ids):
+    """Добавляет рецепты в избранное или корзину пользователя."""
+    with transaction.atomic():
+        added = insert_relations(model, 'recipe', user.id, recipe_ids)
+        if added:
+            Recipe.objects.filter(id__in=added).update(**{
+                model.counter_field: F(model.counter_field) + 1})
+            invalidate_viewer_state(user.id, model.viewer_state)
+            if model is ShoppingCart:
+                shopping_list.add_recipes_to_shopping_list(user, added)
+    return added
+
+
+def remove_recipes(model, user, recipe_ids):
+    """Убирает рецепты из избранного или корзины пользователя."""
+    with transaction.atomic():
+        removed = delete_relations(model, 'recipe', user.id, recipe_ids)
+        if removed:
+            Recipe.objects.filter(**{
+                'id__in': removed,
+                f'{model.counter_field}__gt': 0,
+            }).update(**{
+                model.counter_field: F(model.counter_field) - 1})
+            invalidate_viewer_state(user.id, model.viewer_state)
+            if model is ShoppingCart:
+                shopping_list.remove_recipes_from_shopping_list(
+                    user, removed)
+    return removed
+
+
+def add_subscriptions(user, author_ids):
+    with transaction.atomic():
+        added = insert_relations(
+            Subscription, 'author', user.id, author_ids)
+        if added:
+            User.objects.filter(id__in=added).update(
+                subscribers_count=F('subscribers_count') + 1)
+            backfill_feed(user.id, added)
+            invalidate_viewer_state(user.id, 'subscriptions')
+    return added
+
+
+def remove_subscriptions(user, author_ids):
+    with transaction.atomic():
+        removed = delete_relations(
+            Subscription, 'author', user.id, author_ids)
+        if removed:
+            User.objects.filter(
+                id__in=removed, subscribers_count__gt=0
+            ).update(subscribers_count=F('subscribers_count') - 1)
+            trim_feed(user.id, removed)
+            invalidate_viewer_state(user.id, 'subscriptions')
+    return removed
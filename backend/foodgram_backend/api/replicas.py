@@ -0,0 +1,93 @@
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+
+from .caches import is_shared_cache
+
+state = threading.local()
+
+
+def get_sticky_key(user_id):
+    return f'db_sticky:{user_id}'
+
+
+def get_read_alias():
+    return getattr(state, 'read_alias', None)
+
+
+@contextmanager
+def read_from_primary():
+    """
+    Чтение из основной базы внутри блока: данные, которые кэшируются
+    до смены версии, нельзя брать из отстающей реплики.
+    """
+    alias = get_read_alias()
+    state.read_alias = None
+    try:
+        yield
+    finally:
+        state.read_alias = alias
+
+
+class ReplicaRouter:
+    """
+    Отправляет чтение в реплику, выбранную для текущего запроса
+    ReplicaReadMixin, а запись всегда в основную базу.
+    """
+
+    def db_for_read(self, model, **hints):
+        return get_read_alias()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.REPLICA_DATABASES}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ReplicaReadMixin:
+    """
+    Читающие запросы обслуживаются репликой. Пользователь, который
+    только что что-то изменил, на время READ_YOUR_WRITES_TIMEOUT
+    читает из основной базы, чтобы сразу видеть свои изменения.
+    Отметка об изменении хранится в кэше, поэтому без общего кэша,
+    где ее видят все воркеры, чтение идет из основной базы.
+    Выбранная реплика сбрасывается в dispatch и при необработанном
+    исключении, после которого DRF не вызывает finalize_response.
+    """
+
+    def use_replicas(self):
+        return bool(settings.REPLICA_DATABASES) and is_shared_cache()
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if (self.use_replicas()
+                and request.method in SAFE_METHODS
+                and not (request.user.is_authenticated and cache.get(
+                    get_sticky_key(request.user.id)))):
+            state.read_alias = random.choice(settings.REPLICA_DATABASES)
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            state.read_alias = None
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        state.read_alias = None
+        if (self.use_replicas()
+                and request.method not in SAFE_METHODS
+                and response.status_code < 400
+                and request.user.is_authenticated):
+            cache.set(
+                get_sticky_key(request.user.id), True,
+                settings.READ_YOUR_WRITES_TIMEOUT)
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -0,0 +1,140 @@
+from django.conf import settings
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVector)
+from django.db import connections, router
+from django.db.models import F, Q
+from django.db.models.expressions import RawSQL
+
+from recipes.models import Recipe
+
+FTS_TABLE = 'recipes_recipe_fts'
+SEARCH_INDEX = 'recipe_search_idx'
+
+# Базы, в которых таблица FTS5 уже проверена этим процессом.
+_fts_tables_ready = set()
+
+
+def get_search_vector():
+    config = settings.SEARCH_CONFIG
+    return (
+        SearchVector('name', weight='A', config=config)
+        + SearchVector('text', weight='B', config=config))
+
+
+def create_search_index(connection):
+    """
+    Создает GIN-индекс по search_vector в PostgreSQL. Индекс не описан
+    в Meta модели, чтобы миграции не зависели от СУБД окружения.
+    """
+    if connection.vendor != 'postgresql':
+        return
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE INDEX IF NOT EXISTS {quote(SEARCH_INDEX)} '
+            f'ON {quote(Recipe._meta.db_table)} USING gin '
+            f'({quote(Recipe._meta.get_field("search_vector").column)})')
+
+
+def get_write_connection():
+    return connections[router.db_for_write(Recipe)]
+
+
+def fill_fts_table(cursor):
+    cursor.execute(f'DELETE FROM {FTS_TABLE}')
+    cursor.execute(
+        f'INSERT INTO {FTS_TABLE} (rowid, name, text) '
+        'SELECT id, name, text FROM recipes_recipe')
+
+
+def ensure_fts_table(connection):
+    """
+    Создает таблицу FTS5 в базе SQLite при первом обращении
+    и заполняет ее, если она только что появилась.
+    """
+    if connection.alias in _fts_tables_ready:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM sqlite_master WHERE name = %s', [FTS_TABLE])
+        if cursor.fetchone() is None:
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE {FTS_TABLE} '
+                'USING fts5(name, text, tokenize = "unicode61")')
+            fill_fts_table(cursor)
+    _fts_tables_ready.add(connection.alias)
+
+
+def index_recipe(recipe):
+    """Обновляет поисковый индекс одного рецепта."""
+    connection = get_write_connection()
+    if connection.vendor == 'postgresql':
+        Recipe.objects.filter(id=recipe.id).update(
+            search_vector=get_search_vector())
+    elif connection.vendor == 'sqlite':
+        ensure_fts_table(connection)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [recipe.id])
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, text) '
+                'VALUES (%s, %s, %s)', [recipe.id, recipe.name, recipe.text])
+
+
+def unindex_recipe(recipe_id):
+    connection = get_write_connection()
+    if connection.vendor == 'sqlite':
+        ensure_fts_table(connection)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [recipe_id])
+
+
+def rebuild_search_index():
+    """Полностью пересобирает поисковый индекс рецептов."""
+    connection = get_write_connection()
+    if connection.vendor == 'postgresql':
+        Recipe.objects.update(search_vector=get_search_vector())
+    elif connection.vendor == 'sqlite':
+        ensure_fts_table(connection)
+        with connection.cursor() as cursor:
+            fill_fts_table(cursor)
+
+
+def get_fts_query(value):
+    """Запрос FTS5: каждое слово ищется по началу, кавычки экранируются."""
+    return ' '.join(
+        '"{}"*'.format(word.replace('"', '""')) for word in value.split())
+
+
+def search_recipes(queryset, value):
+    """
+    Отбирает рецепты по поисковой строке и сортирует по релевантности.
+    Индекс берется из той базы, в которую пойдет запрос, в том числе
+    из реплики.
+    """
+    if not value.split():
+        return queryset
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        query = SearchQuery(value, config=settings.SEARCH_CONFIG)
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query)
+        ).order_by('-search_rank', '-id')
+    if connection.vendor == 'sqlite':
+        ensure_fts_table(connection)
+        query = get_fts_query(value)
+        # RawSQL в id__in оборачивается в двойные скобки, которые SQLite
+        # считает скалярным подзапросом, поэтому условие задано через extra.
+        return queryset.extra(
+            where=[
+                f'recipes_recipe.id IN (SELECT rowid FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s)'],
+            params=[query],
+        ).annotate(search_rank=RawSQL(
+            f'SELECT -bm25({FTS_TABLE}, 10.0, 1.0) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = recipes_recipe.id',
+            [query]
+        )).order_by('-search_rank', '-id')
+    return queryset.filter(
+        Q(name__icontains=value) | Q(text__icontains=value))
@@ -1,14 +1,25 @@
 from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework.validators import UniqueValidator
 from rest_framework import serializers
 from drf_extra_fields.fields import Base64ImageField
 
 from users.models import User, Subscription
+from .shopping_list import update_recipe_in_shopping_lists
+from .similar import refresh_similar_recipes
+from .viewer_state import get_viewer_state
 from recipes.models import (
     Tag, Ingredient, RecipeIngredient, Recipe, Favorite, ShoppingCart)
 
 
+def get_recipes_limit(request):
+    """Число рецептов автора в выдаче подписок из recipes_limit."""
+    return int(request.query_params.get(
+        'recipes_limit', settings.PAGE_SIZE))
+
+
 class BaseFavoriteSerializer(serializers.ModelSerializer):
     """Базовый класс-сериализатор списка избранного."""
     user = serializers.PrimaryKeyRelatedField(
@@ -47,33 +58,46 @@ class ShoppingCartSerializer(BaseFavoriteSerializer):
             user=self.context.get('request').user, **validated_data)
 
 
-class SubscriptionSerializer(serializers.ModelSerializer):
-    """Сериализатор класса подписок."""
-    user = serializers.PrimaryKeyRelatedField(
-        read_only=True, default=serializers.CurrentUserDefault())
+class BulkIdsSerializer(serializers.Serializer):
+    """Базовый сериализатор списка id для массовых операций."""
+    model = None
+    not_found = None
 
-    class Meta:
-        model = Subscription
-        fields = ('author', 'user', )
-        validators = [
-            serializers.UniqueTogetherValidator(
-                queryset=Subscription.objects.all(),
-                fields=('author', 'user', )
-            )
-        ]
+    def validate_ids(self, ids):
+        ids = list(dict.fromkeys(ids))
+        missing = set(ids) - set(self.model.objects.filter(
+            id__in=ids).values_list('id', flat=True))
+        if missing:
+            raise serializers.ValidationError(
+                self.not_found.format(', '.join(map(str, sorted(missing)))))
+        return ids
 
-    def create(self, validated_data):
-        return Subscription.objects.create(
-            user=self.context.get('request').user, **validated_data
-        )
 
-    def validate_author(self, value):
-        """Метод валидации поля автор."""
-        if self.context.get('request').user == value:
+class RecipeIdsSerializer(BulkIdsSerializer):
+    """Сериализатор списка рецептов для массового добавления/удаления."""
+    model = Recipe
+    not_found = 'Рецепты не найдены: {}.'
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False, max_length=settings.BULK_RELATIONS_LIMIT)
+
+    def validate_recipes(self, recipes):
+        return self.validate_ids(recipes)
+
+
+class AuthorIdsSerializer(BulkIdsSerializer):
+    """Сериализатор списка авторов для массовой подписки/отписки."""
+    model = User
+    not_found = 'Авторы не найдены: {}.'
+    authors = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False, max_length=settings.BULK_RELATIONS_LIMIT)
+
+    def validate_authors(self, authors):
+        if self.context.get('request').user.id in authors:
             raise serializers.ValidationError(
-                'Вы не можете подписаться на себя!'
-            )
-        return value
+                'Вы не можете подписаться на себя!')
+        return self.validate_ids(authors)
 
 
 class PartialRecipeSerializer(serializers.ModelSerializer):
@@ -81,7 +105,7 @@ class PartialRecipeSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time', )
+        fields = ('id', 'name', 'image', 'thumbnail', 'cooking_time', )
 
 
 class SubscriptionInfoSerializer(serializers.ModelSerializer):
@@ -101,22 +125,26 @@ class SubscriptionInfoSerializer(serializers.ModelSerializer):
                   'is_subscribed', 'recipes', 'recipes_count')
 
     def get_is_subscribed(self, obj):
-        """Метод проверки подписки пользователя на автора."""
-        return Subscription.objects.filter(
-            user=obj.user, author=obj.author).exists()
+        """
+        Метод проверки подписки пользователя на автора.
+        Объект сериализатора сам является подпиской, поэтому
+        дополнительный запрос к базе не нужен.
+        """
+        return True
 
     def get_recipes(self, obj):
         """Метод вывода рецептов автора."""
-        request = self.context.get('request')
-        recipes_limit = request.query_params.get(
-            'recipes_limit', settings.PAGE_SIZE)
-        queryset = obj.author.recipes.all()[:int(recipes_limit)]
+        recipes_limit = get_recipes_limit(self.context.get('request'))
+        if hasattr(obj.author, 'recipe_list'):
+            queryset = obj.author.recipe_list[:recipes_limit]
+        else:
+            queryset = obj.author.recipes.all()[:recipes_limit]
         return PartialRecipeSerializer(
             queryset, many=True).data
 
     def get_recipes_count(self, obj):
         """Метод вывода количества рецептов автора."""
-        return obj.author.recipes.count()
+        return obj.author.recipes_count
 
 
 class UserInfoSerializer(UserSerializer):
@@ -130,15 +158,16 @@ class UserInfoSerializer(UserSerializer):
             'username',
             'first_name',
             'last_name',
-            'is_subscribed'
+            'is_subscribed',
+            'recipes_count',
+            'subscribers_count',
         )
         read_only_fields = ('email', )
 
     def get_is_subscribed(self, obj):
         """Метод проверки подписки пользователя на автора."""
-        user = self.context.get('request').user
-        return user.is_authenticated and Subscription.objects.filter(
-            user=user, author=obj.id).exists()
+        return obj.id in get_viewer_state(
+            self.context.get('request')).subscriptions
 
 
 class UserRegistrationSerializer(UserCreateSerializer):
@@ -200,7 +229,8 @@ class RecipeSerializer(serializers.ModelSerializer):
         model = Recipe
         fields = (
             'id', 'tags', 'author', 'ingredients', 'is_favorited',
-            'is_in_shopping_cart', 'name', 'image', 'text', 'cooking_time',)
+            'is_in_shopping_cart', 'name', 'image', 'thumbnail', 'text',
+            'cooking_time', 'favorites_count', 'shopping_carts_count',)
 
     def get_author(self, obj):
         """Метод получения информации об авторе рецепта."""
@@ -210,15 +240,13 @@ class RecipeSerializer(serializers.ModelSerializer):
 
     def get_is_favorited(self, obj):
         """Метод получения информации о том, является ли рецепт избранным."""
-        user = self.context.get('request').user
-        return user.is_authenticated and (
-            user.favorites.filter(recipe__id=obj.id).exists())
+        return obj.id in get_viewer_state(
+            self.context.get('request')).favorites
 
     def get_is_in_shopping_cart(self, obj):
         """Метод получения информации о том, находится ли рецепт в корзине."""
-        user = self.context.get('request').user
-        return user.is_authenticated and (
-            user.shoppingcarts.filter(recipe__id=obj.id).exists())
+        return obj.id in get_viewer_state(
+            self.context.get('request')).shopping_cart
 
 
 class IngredientAmountSerializer(serializers.ModelSerializer):
@@ -266,9 +294,7 @@ class RecipePostSerializer(serializers.ModelSerializer):
         Вспомогательный метод создания объектов
         связанной модели ингредиенты рецепта.
         """
-        for tag in tags:
-            recipe.tags.add(tag)
-            recipe.save()
+        recipe.tags.set(tags)
         RecipeIngredient.objects.bulk_create([RecipeIngredient(
             ingredient_id=ingredient.get('id'),
             amount=ingredient.get('amount'),
@@ -276,25 +302,74 @@ class RecipePostSerializer(serializers.ModelSerializer):
         ) for ingredient in ingredients])
         return recipe
 
+    def update_ingredients(self, recipe, ingredients):
+        """
+        Вспомогательный метод изменения состава рецепта: удаляет,
+        обновляет и добавляет только изменившиеся ингредиенты.
+        """
+        current = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in RecipeIngredient.objects.filter(
+                recipe=recipe)
+        }
+        old_amounts = {
+            ingredient_id: recipe_ingredient.amount
+            for ingredient_id, recipe_ingredient in current.items()
+        }
+        new_amounts = {
+            ingredient['id']: ingredient['amount']
+            for ingredient in ingredients
+        }
+        RecipeIngredient.objects.filter(id__in=[
+            recipe_ingredient.id
+            for ingredient_id, recipe_ingredient in current.items()
+            if ingredient_id not in new_amounts
+        ]).delete()
+        changed = []
+        created = []
+        for ingredient_id, amount in new_amounts.items():
+            recipe_ingredient = current.get(ingredient_id)
+            if recipe_ingredient is None:
+                created.append(RecipeIngredient(
+                    ingredient_id=ingredient_id, amount=amount,
+                    recipe=recipe))
+            elif recipe_ingredient.amount != amount:
+                recipe_ingredient.amount = amount
+                changed.append(recipe_ingredient)
+        RecipeIngredient.objects.bulk_update(changed, ('amount', ))
+        RecipeIngredient.objects.bulk_create(created)
+        update_recipe_in_shopping_lists(recipe, old_amounts, new_amounts)
+
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         recipe = Recipe.objects.create(**validated_data)
+        transaction.on_commit(lambda: refresh_similar_recipes([recipe.id]))
         return self.add_ingredients_and_tags(
             tags, ingredients, recipe
         )
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        instance.ingredients.clear()
-        instance.tags.clear()
-        ingredients = validated_data.pop('ingredients')
-        tags = validated_data.pop('tags')
+        # Блокирует рецепт от параллельного изменения до конца транзакции.
+        Recipe.objects.select_for_update().filter(id=instance.id).exists()
+        ingredients = validated_data.pop('ingredients', None)
+        tags = validated_data.pop('tags', None)
         instance = super().update(instance, validated_data)
-        return self.add_ingredients_and_tags(
-            tags, ingredients, instance
-        )
+        if tags is not None:
+            instance.tags.set(tags)
+        if ingredients is not None:
+            self.update_ingredients(instance, ingredients)
+        if tags is not None or ingredients is not None:
+            transaction.on_commit(
+                lambda: refresh_similar_recipes([instance.id]))
+        return instance
 
     def to_representation(self, recipe):
+        prefetch_related_objects([recipe], 'tags', Prefetch(
+            'recipeingredients',
+            queryset=RecipeIngredient.objects.select_related('ingredient')))
         return RecipeSerializer(
             recipe,
             context={'request': self.context.get('request')}
@@ -1,11 +1,48 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+import csv
+import json
+from tempfile import SpooledTemporaryFile
 
-from recipes.models import RecipeIngredient
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.http import StreamingHttpResponse
 
+from recipes.models import (
+    RecipeIngredient, ShoppingCart, ShoppingListIngredient)
 
-def get_ingredients_for_shopping(user):
-    ingredients = RecipeIngredient.objects.filter(
+try:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen import canvas
+except ImportError:
+    canvas = None
+
+TITLE = 'Список продуктов к покупке:'
+CHUNK_SIZE = 64 * 1024
+
+
+class Echo:
+    """Псевдо-буфер, отдающий записанную строку вместо её хранения."""
+
+    def write(self, value):
+        return value
+
+
+def get_ingredients(user):
+    """Суммарное количество ингредиентов из списка покупок пользователя."""
+    return ShoppingListIngredient.objects.filter(
+        user=user, amount__gt=0
+    ).values(
+        'ingredient__name',
+        'ingredient__measurement_unit',
+        value=F('amount'),
+    ).order_by('ingredient__name')
+
+
+def get_aggregated_ingredients(user):
+    """Суммарное количество ингредиентов, посчитанное по корзине."""
+    return RecipeIngredient.objects.filter(
         recipe__shoppingcarts__user=user
     ).values(
         'ingredient__name',
@@ -13,18 +50,186 @@ def get_ingredients_for_shopping(user):
     ).annotate(
         value=Sum('amount')
     ).order_by('ingredient__name')
-    response = HttpResponse(
-        content_type='text/plain',
-        charset='utf-8',
-    )
-    response['Content-Disposition'] = (
-        'attachment; filename="shopping_list.txt"'
-    )
-    response.write('Список продуктов к покупке:\n')
+
+
+def get_recipe_amounts(recipe):
+    """Количество каждого ингредиента рецепта."""
+    return dict(
+        recipe.recipeingredients.values_list('ingredient_id', 'amount'))
+
+
+def update_shopping_lists(user_ids, deltas):
+    """
+    Применяет приращения количества ингредиентов {id: delta}
+    к спискам покупок пользователей одним запросом на обновление.
+    """
+    deltas = {
+        ingredient_id: delta
+        for ingredient_id, delta in deltas.items() if delta
+    }
+    user_ids = list(user_ids)
+    if not deltas or not user_ids:
+        return
+    with transaction.atomic():
+        ShoppingListIngredient.objects.bulk_create([
+            ShoppingListIngredient(user_id=user_id, ingredient_id=ingredient)
+            for user_id in user_ids
+            for ingredient, delta in deltas.items() if delta > 0
+        ], ignore_conflicts=True)
+        items = ShoppingListIngredient.objects.filter(
+            user_id__in=user_ids, ingredient_id__in=deltas)
+        items.update(amount=F('amount') + Case(
+            *(When(ingredient_id=ingredient, then=Value(delta))
+              for ingredient, delta in deltas.items()),
+            default=Value(0),
+            output_field=IntegerField(),
+        ))
+        items.filter(amount__lte=0).delete()
+
+
+def get_recipes_amounts(recipe_ids):
+    """Суммарное количество ингредиентов нескольких рецептов."""
+    return dict(RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values('ingredient').annotate(
+        value=Sum('amount')
+    ).order_by().values_list('ingredient', 'value'))
+
+
+def add_recipes_to_shopping_list(user, recipe_ids):
+    update_shopping_lists([user.id], get_recipes_amounts(recipe_ids))
+
+
+def remove_recipes_from_shopping_list(user, recipe_ids):
+    update_shopping_lists([user.id], {
+        ingredient: -amount
+        for ingredient, amount in get_recipes_amounts(recipe_ids).items()
+    })
+
+
+def update_recipe_in_shopping_lists(recipe, old_amounts, new_amounts):
+    """Переносит изменение состава рецепта в списки покупок."""
+    update_shopping_lists(
+        ShoppingCart.objects.filter(
+            recipe=recipe).values_list('user_id', flat=True),
+        {
+            ingredient: (
+                new_amounts.get(ingredient, 0)
+                - old_amounts.get(ingredient, 0))
+            for ingredient in old_amounts.keys() | new_amounts.keys()
+        })
+
+
+def rebuild_shopping_lists(user_ids=None, batch_size=1000):
+    """Пересобирает списки покупок пользователей по их корзинам."""
+    items = ShoppingListIngredient.objects.all()
+    amounts = RecipeIngredient.objects.filter(
+        recipe__shoppingcarts__isnull=False)
+    if user_ids is not None:
+        items = items.filter(user_id__in=user_ids)
+        amounts = amounts.filter(recipe__shoppingcarts__user__in=user_ids)
+    amounts = amounts.values(
+        'recipe__shoppingcarts__user', 'ingredient'
+    ).annotate(value=Sum('amount')).order_by()
+    with transaction.atomic():
+        items.delete()
+        batch = []
+        for row in amounts.iterator():
+            batch.append(ShoppingListIngredient(
+                user_id=row['recipe__shoppingcarts__user'],
+                ingredient_id=row['ingredient'],
+                amount=row['value']))
+            if len(batch) >= batch_size:
+                ShoppingListIngredient.objects.bulk_create(batch)
+                batch = []
+        ShoppingListIngredient.objects.bulk_create(batch)
+
+
+def render_txt(ingredients):
+    yield f'{TITLE}\n'
     for ingredient in ingredients:
-        response.write(
+        yield (
             f'- {ingredient["ingredient__name"]} '
             f'- {ingredient["value"]} '
             f'{ingredient["ingredient__measurement_unit"]}\n'
         )
+
+
+def render_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'amount', 'measurement_unit'))
+    for ingredient in ingredients:
+        yield writer.writerow((
+            ingredient['ingredient__name'],
+            ingredient['value'],
+            ingredient['ingredient__measurement_unit'],
+        ))
+
+
+def render_json(ingredients):
+    separator = '['
+    for ingredient in ingredients:
+        yield separator + json.dumps({
+            'name': ingredient['ingredient__name'],
+            'amount': ingredient['value'],
+            'measurement_unit': ingredient['ingredient__measurement_unit'],
+        }, ensure_ascii=False)
+        separator = ','
+    yield '[]' if separator == '[' else ']'
+
+
+def render_pdf(ingredients):
+    """
+    PDF нельзя отдавать по частям до завершения документа, поэтому он
+    пишется во временный файл, который при росте сбрасывается на диск,
+    и уже затем отдается клиенту блоками.
+    """
+    font_name = 'ShoppingListFont'
+    if font_name not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(
+            TTFont(font_name, settings.SHOPPING_LIST_PDF_FONT))
+    with SpooledTemporaryFile(max_size=CHUNK_SIZE) as file:
+        document = canvas.Canvas(file, pagesize=A4)
+        width, height = A4
+        line_height = 18
+        y = height - 2 * line_height
+        document.setFont(font_name, 14)
+        document.drawString(2 * line_height, y, TITLE)
+        document.setFont(font_name, 12)
+        for ingredient in ingredients:
+            y -= line_height
+            if y < 2 * line_height:
+                document.showPage()
+                document.setFont(font_name, 12)
+                y = height - 2 * line_height
+            document.drawString(
+                2 * line_height, y,
+                f'- {ingredient["ingredient__name"]} '
+                f'- {ingredient["value"]} '
+                f'{ingredient["ingredient__measurement_unit"]}'
+            )
+        document.save()
+        file.seek(0)
+        yield from iter(lambda: file.read(CHUNK_SIZE), b'')
+
+
+SHOPPING_LIST_FORMATS = {
+    'txt': (render_txt, 'text/plain; charset=utf-8'),
+    'csv': (render_csv, 'text/csv; charset=utf-8'),
+    'json': (render_json, 'application/json; charset=utf-8'),
+}
+if canvas is not None:
+    SHOPPING_LIST_FORMATS['pdf'] = (render_pdf, 'application/pdf')
+
+
+def get_ingredients_for_shopping(user, file_format='txt'):
+    """Потоковый ответ со списком покупок в выбранном формате."""
+    render, content_type = SHOPPING_LIST_FORMATS[file_format]
+    response = StreamingHttpResponse(
+        render(get_ingredients(user).iterator()),
+        content_type=content_type,
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="shopping_list.{file_format}"'
+    )
     return response
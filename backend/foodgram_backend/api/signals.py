@@ -0,0 +1,213 @@
+from django.db import connections, transaction
+from django.db.models import F
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_migrate, post_save, pre_delete)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from recipes.images import (
+    get_thumbnail_name, schedule_recipe_image_processing)
+from users.models import Subscription, User
+from recipes.models import (
+    MAX_MASK_TAG_ID, Favorite, Ingredient, Recipe, RecipeIngredient,
+    ShoppingCart, SimilarRecipe, Tag, get_tag_mask, update_tag_masks)
+from .authentication import revoke_cached_tokens
+from .catalog import bump_catalog_version
+from .feed import fan_out_recipe
+from .fragments import bump_author_fragments, bump_recipe_fragments
+from .search import create_search_index, index_recipe, unindex_recipe
+from .shopping_list import get_recipe_amounts, update_recipe_in_shopping_lists
+from .similar import recompute_similar_recipes
+from .viewer_state import invalidate_viewer_state
+
+AUTHOR_FRAGMENT_FIELDS = {'email', 'username', 'first_name', 'last_name'}
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    """Сбрасывает кэш и индекс поиска при изменении ингредиентов."""
+    bump_catalog_version('ingredients')
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tag_changed(sender, **kwargs):
+    """Сбрасывает кэш тегов при их изменении."""
+    bump_catalog_version('tags')
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_fragments_changed(sender, instance, created, **kwargs):
+    """Сбрасывает фрагменты рецептов с измененным ингредиентом."""
+    if not created:
+        bump_recipe_fragments(RecipeIngredient.objects.filter(
+            ingredient=instance).values_list('recipe_id', flat=True))
+
+
+@receiver(post_save, sender=Tag)
+def tag_fragments_changed(sender, instance, created, **kwargs):
+    """Сбрасывает фрагменты рецептов с измененным тегом."""
+    if not created:
+        bump_recipe_fragments(
+            instance.recipes.values_list('id', flat=True))
+
+
+@receiver(pre_delete, sender=Tag)
+def tag_deleted(sender, instance, **kwargs):
+    """Снимает бит удаляемого тега с масок и фрагментов рецептов."""
+    bump_recipe_fragments(instance.recipes.values_list('id', flat=True))
+    if instance.id <= MAX_MASK_TAG_ID:
+        Recipe.objects.filter(tags=instance).update(
+            tag_mask=F('tag_mask').bitand(~get_tag_mask([instance.id])))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Пересчитывает маски тегов и сбрасывает фрагменты рецептов."""
+    if action == 'pre_clear' and reverse:
+        instance.cleared_recipe_ids = list(
+            instance.recipes.values_list('id', flat=True))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        recipe_ids = [instance.id]
+    elif action == 'post_clear':
+        recipe_ids = instance.cleared_recipe_ids
+    else:
+        recipe_ids = pk_set
+    update_tag_masks(recipe_ids)
+    bump_recipe_fragments(recipe_ids)
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def recipe_ingredients_changed(sender, instance, **kwargs):
+    """Сбрасывает фрагмент рецепта при изменении его ингредиентов."""
+    bump_recipe_fragments([instance.recipe_id])
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    """Убирает удаляемый рецепт из списков покупок."""
+    update_recipe_in_shopping_lists(instance, get_recipe_amounts(instance), {})
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_similar_deleted(sender, instance, **kwargs):
+    """
+    Пересчитывает соседей рецептов, в списках которых стоял удаляемый
+    рецепт: после каскадного удаления на его место встает следующий
+    кандидат.
+    """
+    recipe_ids = set(SimilarRecipe.objects.filter(
+        similar=instance).values_list('recipe_id', flat=True))
+    transaction.on_commit(lambda: recompute_similar_recipes(recipe_ids))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_search_updated(sender, instance, **kwargs):
+    """Обновляет поисковый индекс и фрагмент сохраненного рецепта."""
+    index_recipe(instance)
+    bump_recipe_fragments([instance.id])
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_search_deleted(sender, instance, **kwargs):
+    unindex_recipe(instance.id)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, **kwargs):
+    """Запускает создание миниатюры при смене картинки рецепта."""
+    if not instance.image:
+        return
+    if instance.thumbnail.name == get_thumbnail_name(instance.image.name):
+        return
+    if instance.thumbnail:
+        instance.thumbnail = ''
+        Recipe.objects.filter(id=instance.id).update(thumbnail='')
+    schedule_recipe_image_processing(instance.id, instance.image.name)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(sender, instance, created, **kwargs):
+    """Увеличивает счетчик рецептов автора и рассылает рецепт в ленты."""
+    if created:
+        User.objects.filter(id=instance.author_id).update(
+            recipes_count=F('recipes_count') + 1)
+        fan_out_recipe(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_counter_deleted(sender, instance, **kwargs):
+    """Уменьшает счетчик рецептов автора."""
+    User.objects.filter(id=instance.author_id, recipes_count__gt=0).update(
+        recipes_count=F('recipes_count') - 1)
+
+
+@receiver(post_save, sender=User)
+def author_saved(sender, instance, update_fields=None, **kwargs):
+    """Сбрасывает фрагменты рецептов при изменении данных автора."""
+    if update_fields is None or AUTHOR_FRAGMENT_FIELDS & set(update_fields):
+        bump_author_fragments([instance.id])
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+@receiver((post_save, post_delete), sender=ShoppingCart)
+@receiver((post_save, post_delete), sender=Subscription)
+def viewer_relation_changed(sender, instance, **kwargs):
+    """
+    Сбрасывает закэшированное множество пользователя при изменении
+    через ORM, админку или каскадное удаление. relations.py пишет
+    сырым SQL без сигналов и сбрасывает его сам.
+    """
+    invalidate_viewer_state(instance.user_id, sender.viewer_state)
+
+
+def get_counter_delta(kwargs):
+    """+1 для созданной записи, -1 для удаленной, 0 для измененной."""
+    if kwargs['signal'] is post_delete:
+        return -1
+    return 1 if kwargs['created'] else 0
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def recipe_relation_counted(sender, instance, **kwargs):
+    """Ведет счетчик избранного или корзин рецепта."""
+    delta = get_counter_delta(kwargs)
+    if delta:
+        Recipe.objects.filter(
+            id=instance.recipe_id, **{f'{sender.counter_field}__gte': -delta}
+        ).update(**{sender.counter_field: F(sender.counter_field) + delta})
+
+
+@receiver((post_save, post_delete), sender=Subscription)
+def subscription_counted(sender, instance, **kwargs):
+    """Ведет счетчик подписчиков автора."""
+    delta = get_counter_delta(kwargs)
+    if delta:
+        User.objects.filter(
+            id=instance.author_id, subscribers_count__gte=-delta
+        ).update(subscribers_count=F('subscribers_count') + delta)
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    """Отзывает закэшированный токен при выходе или удалении."""
+    revoke_cached_tokens([instance.key])
+
+
+@receiver(post_save, sender=User)
+def user_tokens_changed(sender, instance, **kwargs):
+    """
+    Убирает из кэша токены пользователя при смене пароля, деактивации
+    и любом другом изменении, чтобы request.user не был устаревшим.
+    """
+    revoke_cached_tokens(
+        Token.objects.filter(user=instance).values_list('key', flat=True))
+
+
+@receiver(post_migrate)
+def search_index_migrated(sender, app_config, using, **kwargs):
+    """Создает поисковый индекс после миграций приложения рецептов."""
+    if app_config.label == 'recipes':
+        create_search_index(connections[using])
@@ -0,0 +1,183 @@
+import heapq
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+
+from recipes.models import Recipe, RecipeIngredient, SimilarRecipe
+
+
+def get_recipe_sets(recipe_ids):
+    """Разреженные векторы рецептов: {id: (ингредиенты, теги)}."""
+    sets = {recipe_id: (set(), set()) for recipe_id in recipe_ids}
+    for recipe_id, ingredient_id in RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids).values_list(
+                'recipe_id', 'ingredient_id').iterator():
+        sets[recipe_id][0].add(ingredient_id)
+    for recipe_id, tag_id in Recipe.tags.through.objects.filter(
+            recipe_id__in=recipe_ids).values_list(
+                'recipe_id', 'tag_id').iterator():
+        sets[recipe_id][1].add(tag_id)
+    return sets
+
+
+def get_candidates(sets):
+    """
+    Рецепты с общими ингредиентами по обратному индексу
+    RecipeIngredient. Ингредиенты, которые есть больше чем в
+    SIMILAR_RECIPES_MAX_POSTINGS рецептах (соль, сахар), кандидатов
+    не порождают, но учитываются в сходстве найденных.
+    """
+    ingredient_ids = set().union(*(ings for ings, _ in sets.values()))
+    rare = RecipeIngredient.objects.filter(
+        ingredient_id__in=ingredient_ids
+    ).order_by().values('ingredient_id').annotate(total=Count('id')).filter(
+        total__lte=settings.SIMILAR_RECIPES_MAX_POSTINGS
+    ).values_list('ingredient_id', flat=True)
+    postings = defaultdict(set)
+    for ingredient_id, recipe_id in RecipeIngredient.objects.filter(
+            ingredient_id__in=list(rare), recipe_id__isnull=False
+    ).values_list('ingredient_id', 'recipe_id').iterator():
+        postings[ingredient_id].add(recipe_id)
+    return {
+        recipe_id: set().union(
+            *(postings[ingredient_id] for ingredient_id in ings)
+        ) - {recipe_id}
+        for recipe_id, (ings, _) in sets.items()
+    }
+
+
+def get_score(first, second):
+    return len(first[0] & second[0]) + len(first[1] & second[1])
+
+
+def get_top(scores):
+    """Не больше SIMILAR_RECIPES_COUNT соседей [(сходство, id), ...]."""
+    return heapq.nlargest(settings.SIMILAR_RECIPES_COUNT, (
+        (score, similar_id) for similar_id, score in scores.items()))
+
+
+def compute_scores(recipe_ids):
+    """
+    Сходство рецептов со всеми их кандидатами
+    {id: {id кандидата: сходство}} по числу общих ингредиентов и тегов.
+    """
+    sets = get_recipe_sets(recipe_ids)
+    candidates = get_candidates(sets)
+    sets.update(get_recipe_sets(
+        set().union(*candidates.values()) - sets.keys()))
+    return {
+        recipe_id: {
+            candidate: get_score(sets[recipe_id], sets[candidate])
+            for candidate in candidates[recipe_id]
+        } for recipe_id in recipe_ids
+    }
+
+
+def compute_similar(recipe_ids):
+    """Ближайшие соседи рецептов {id: [(сходство, id соседа), ...]}."""
+    return {
+        recipe_id: get_top(scores)
+        for recipe_id, scores in compute_scores(recipe_ids).items()
+    }
+
+
+@transaction.atomic
+def save_similar(neighbours):
+    """Заменяет сохраненных соседей переданных рецептов."""
+    SimilarRecipe.objects.filter(recipe_id__in=list(neighbours)).delete()
+    SimilarRecipe.objects.bulk_create([
+        SimilarRecipe(recipe_id=recipe_id, similar_id=similar_id, score=score)
+        for recipe_id, rows in neighbours.items()
+        for score, similar_id in rows
+    ])
+
+
+def rebuild_similar_recipes(batch_size=500):
+    """Полностью пересчитывает похожие рецепты пачками."""
+    recipe_ids = list(
+        Recipe.objects.order_by('id').values_list('id', flat=True))
+    for start in range(0, len(recipe_ids), batch_size):
+        save_similar(compute_similar(recipe_ids[start:start + batch_size]))
+
+
+def recompute_similar_recipes(recipe_ids):
+    """Пересчитывает соседей рецептов целиком."""
+    if recipe_ids:
+        save_similar(compute_similar(list(recipe_ids)))
+
+
+def get_current(recipe_ids, changed_ids):
+    """
+    Сохраненные соседи {id: {id соседа: сходство}} рецептов recipe_ids
+    и рецептов, в чьих списках есть измененные рецепты.
+    """
+    current = defaultdict(dict)
+    for recipe_id, similar_id, score in SimilarRecipe.objects.filter(
+            Q(recipe_id__in=list(recipe_ids)) | Q(recipe_id__in=(
+                SimilarRecipe.objects.filter(
+                    similar_id__in=list(changed_ids)).values('recipe_id')))
+    ).values_list('recipe_id', 'similar_id', 'score'):
+        current[recipe_id][similar_id] = score
+    return current
+
+
+def place_recipe(rows, recipe_id, score):
+    """
+    Ставит рецепт с новым сходством в соседи rows {id: сходство}:
+    обновляет его, добавляет, если список не заполнен или рецепт
+    сильнее последнего соседа, и убирает, если он больше не кандидат.
+    Возвращает False, если рецепт опустился или выпал из заполненного
+    списка: его место может занять кандидат, которого в списке нет,
+    и список нужно пересчитать целиком.
+    """
+    count = settings.SIMILAR_RECIPES_COUNT
+    old = rows.pop(recipe_id, None)
+    if old is not None and len(rows) + 1 >= count and (
+            score is None or score < old):
+        return False
+    if score is not None:
+        rows[recipe_id] = score
+        if len(rows) > count:
+            del rows[min(rows, key=lambda other: (rows[other], other))]
+    return True
+
+
+def refresh_similar_recipes(recipe_ids):
+    """
+    Обновляет соседей измененных рецептов и только тех рецептов,
+    для которых они кандидаты или уже стоят в списке соседей. Чтение
+    идет вне транзакции записи, чтобы не держать блокировку SQLite.
+    """
+    changed = set(recipe_ids)
+    scores = compute_scores(recipe_ids)
+    current = get_current(
+        set().union(*(candidates.keys() for candidates in scores.values())),
+        changed)
+    listed = defaultdict(set)
+    for other_id, rows in current.items():
+        for similar_id in rows.keys() & changed:
+            listed[similar_id].add(other_id)
+    updated = set()
+    recompute = set()
+    for recipe_id in recipe_ids:
+        others = scores[recipe_id].keys() | listed[recipe_id]
+        for other_id in others - changed - recompute:
+            rows = current[other_id]
+            before = dict(rows)
+            if not place_recipe(
+                    rows, recipe_id, scores[recipe_id].get(other_id)):
+                recompute.add(other_id)
+            elif rows != before:
+                updated.add(other_id)
+    neighbours = {
+        recipe_id: get_top(candidates)
+        for recipe_id, candidates in scores.items()
+    }
+    neighbours.update(
+        (other_id, get_top(current[other_id]))
+        for other_id in updated - recompute)
+    if recompute:
+        neighbours.update(compute_similar(list(recompute)))
+    save_similar(neighbours)
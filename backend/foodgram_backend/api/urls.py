@@ -1,4 +1,4 @@
-from django.urls import path, include
+from django.urls import path, include, re_path
 from djoser.urls.authtoken import urlpatterns
 from rest_framework.routers import DefaultRouter
 
@@ -15,5 +15,6 @@ router_v1.register(r'tags', views.TagViewSet, basename='tag')
 
 urlpatterns = [
     path('auth/', include(urlpatterns)),
+    re_path(r'^health/?$', views.HealthView.as_view(), name='health'),
     path('', include(router_v1.urls)),
 ]
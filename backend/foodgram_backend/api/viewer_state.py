@@ -0,0 +1,83 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .caches import is_shared_cache
+from recipes.models import Favorite, ShoppingCart
+from users.models import Subscription
+
+VIEWER_STATE_SOURCES = {
+    'favorites': (Favorite, 'recipe_id'),
+    'shopping_cart': (ShoppingCart, 'recipe_id'),
+    'subscriptions': (Subscription, 'author_id'),
+}
+
+
+class ViewerState:
+    """
+    Множества id избранных рецептов, рецептов в корзине и авторов,
+    на которых подписан пользователь.
+    """
+
+    def __init__(self, favorites=(), shopping_cart=(), subscriptions=()):
+        self.favorites = frozenset(favorites)
+        self.shopping_cart = frozenset(shopping_cart)
+        self.subscriptions = frozenset(subscriptions)
+
+
+def get_state_key(user_id, name):
+    return f'viewer_state:{user_id}:{name}'
+
+
+def load_state_part(user_id, name):
+    model, field = VIEWER_STATE_SOURCES[name]
+    return tuple(sorted(model.objects.filter(
+        user_id=user_id).values_list(field, flat=True)))
+
+
+def invalidate_viewer_state(user_id, name):
+    """
+    Удаляет множество из кэша сразу и еще раз после фиксации
+    транзакции: следующий запрос перечитает его из базы. Удаление,
+    в отличие от записи перечитанного множества, не зависит от порядка,
+    в котором завершились параллельные изменения.
+    """
+    key = get_state_key(user_id, name)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def get_viewer_state(request):
+    """
+    Состояние текущего пользователя: берется из кэша одним get_many
+    и запоминается на время запроса. С кэшем одного процесса изменения
+    из других воркеров в нем не видны, поэтому состояние читается
+    из базы на каждый запрос.
+    """
+    state = getattr(request, 'viewer_state', None)
+    if state is not None:
+        return state
+    user = request.user
+    if not user.is_authenticated:
+        state = ViewerState()
+    elif not is_shared_cache():
+        state = ViewerState(**{
+            name: load_state_part(user.id, name)
+            for name in VIEWER_STATE_SOURCES
+        })
+    else:
+        keys = {
+            name: get_state_key(user.id, name)
+            for name in VIEWER_STATE_SOURCES
+        }
+        cached = cache.get_many(keys.values())
+        parts = {}
+        for name, key in keys.items():
+            if key in cached:
+                parts[name] = cached[key]
+            else:
+                parts[name] = load_state_part(user.id, name)
+                cache.set(key, parts[name], settings.VIEWER_STATE_TIMEOUT)
+        state = ViewerState(**parts)
+    request.viewer_state = state
+    return state
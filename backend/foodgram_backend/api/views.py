@@ -1,89 +1,221 @@
+from django.conf import settings
+from django.db.models import F, Prefetch, Window, prefetch_related_objects
+from django.db.models.functions import RowNumber
+from django.http import Http404, HttpResponse
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
-from rest_framework import permissions, status, viewsets
+from rest_framework import generics, permissions, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
-from . import serializers, filters, shopping_list
+from . import (
+    serializers, fast_serializers, filters, relations, shopping_list)
+from .catalog import CatalogCacheMixin
+from .feed import get_feed_filter
+from .ingredient_index import ingredient_index
+from .metrics import render_metrics
+from .middleware import SerializeTimingMixin, measure_serialization
 from .permissions import IsAuthorOrReadOnly
+from .replicas import ReplicaReadMixin
 from users.models import User
 from recipes.models import (
-    Tag, Ingredient, Recipe, Favorite, ShoppingCart)
-from api.pagination import PageLimitPagination
+    Tag, Ingredient, Recipe, RecipeIngredient, Favorite, ShoppingCart)
+from api.pagination import FeedPagination, PageLimitPagination
 
 
-class UserViewSet(UserViewSet):
+class UserViewSet(ReplicaReadMixin, SerializeTimingMixin, UserViewSet):
     """Класс-контроллер для модели пользователя."""
     pagination_class = PageLimitPagination
 
     @action(methods=['get'], detail=False)
     def me(self, request, *args, **kwargs):
         """Метод эндпоинта с информацией о текущем пользователе."""
-        self.get_object = self.get_instance
+        self.get_object = self.get_current_user
         return self.retrieve(request, *args, **kwargs)
 
+    def get_current_user(self):
+        """
+        Пользователь из базы: закэшированный при аутентификации
+        request.user может хранить устаревшие счетчики.
+        """
+        return get_object_or_404(User, id=self.request.user.id)
+
+    def prefetch_author_recipes(self, subscriptions):
+        """
+        Загружает одним запросом на всю страницу последние recipes_limit
+        рецептов каждого автора. ROW_NUMBER() нумерует рецепты внутри
+        автора, и из базы приходят только первые из них.
+        """
+        if not subscriptions:
+            return
+        ranked = Recipe.objects.filter(author_id__in=[
+            subscription.author_id for subscription in subscriptions
+        ]).annotate(position=Window(
+            RowNumber(), partition_by=[F('author_id')],
+            order_by=F('id').desc(),
+        )).order_by().values('id', 'position')
+        sql, params = ranked.query.sql_with_params()
+        prefetch_related_objects(subscriptions, Prefetch(
+            'author__recipes',
+            queryset=Recipe.objects.only(
+                'id', 'name', 'image', 'thumbnail', 'cooking_time',
+                'author_id',
+            ).extra(
+                where=[
+                    f'recipes_recipe.id IN (SELECT ranked.id FROM ({sql}) '
+                    f'ranked WHERE ranked.position <= %s)'],
+                params=[*params, serializers.get_recipes_limit(self.request)],
+            ),
+            to_attr='recipe_list'))
+
     @action(
         methods=['post', 'delete'], detail=True,
         permission_classes=(permissions.IsAuthenticated, ))
     def subscribe(self, request, *args, **kwargs):
         """Метод эндпоинта подписки/отписки на автора."""
-        author = get_object_or_404(User, id=kwargs['id'])
+        author_id = int(kwargs['id'])
         if request.method == 'POST':
-            data = request.data.copy()
-            data.update({'author': author.id})
-            serializer = serializers.SubscriptionSerializer(
-                data=data, context={'request': request})
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
-            return Response(
-                status=status.HTTP_201_CREATED,
-                data=self.get_serializer(author).data)
-        obj = request.user.subscriber.filter(author=author)
-        if not obj.exists():
+            author = get_object_or_404(User, id=author_id)
+            if author == request.user:
+                return Response(
+                    {'errors': 'Вы не можете подписаться на себя!'},
+                    status=status.HTTP_400_BAD_REQUEST)
+            if not relations.add_subscriptions(request.user, [author.id]):
+                return Response(
+                    {'errors': 'Вы уже подписаны на данного автора.'},
+                    status=status.HTTP_400_BAD_REQUEST)
+            subscription = request.user.subscriber.select_related(
+                'author').get(author=author)
+            self.prefetch_author_recipes([subscription])
+            with measure_serialization(request):
+                data = serializers.SubscriptionInfoSerializer(
+                    subscription, context={'request': request}).data
+            return Response(status=status.HTTP_201_CREATED, data=data)
+        if not relations.remove_subscriptions(request.user, [author_id]):
+            get_object_or_404(User, id=author_id)
             return Response(
                 {'errors': 'Вы не подписаны на данного автора.'},
                 status=status.HTTP_400_BAD_REQUEST)
-        obj.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @action(
+        methods=['post', 'delete'], detail=False, url_path='subscribe',
+        url_name='subscribe-bulk',
+        permission_classes=(permissions.IsAuthenticated, ))
+    def subscribe_bulk(self, request, *args, **kwargs):
+        """Метод эндпоинта подписки/отписки на несколько авторов сразу."""
+        serializer = serializers.AuthorIdsSerializer(
+            data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        authors = serializer.validated_data['authors']
+        if request.method == 'POST':
+            return Response(
+                {'added': relations.add_subscriptions(request.user, authors)},
+                status=status.HTTP_201_CREATED)
+        return Response(
+            {'removed': relations.remove_subscriptions(request.user, authors)})
+
     @action(
         methods=['get'], detail=False,
         permission_classes=(permissions.IsAuthenticated, ),
         serializer_class=serializers.SubscriptionInfoSerializer)
     def subscriptions(self, request, *args, **kwargs):
         """Метод эндпоинта подписок текущего пользователя."""
-        queryset = request.user.subscriber.all()
-        pages = self.paginate_queryset(queryset)
-        serializer = self.get_serializer(
-            pages, many=True, context={'request': request})
-        return self.get_paginated_response(serializer.data)
+        pages = self.paginate_queryset(
+            request.user.subscriber.select_related('author'))
+        self.prefetch_author_recipes(pages)
+        with measure_serialization(request):
+            data = self.get_serializer(
+                pages, many=True, context={'request': request}).data
+        return self.get_paginated_response(data)
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(
+        ReplicaReadMixin, CatalogCacheMixin, SerializeTimingMixin,
+        viewsets.ReadOnlyModelViewSet):
     """Класс-контроллер модели тег."""
+    catalog = 'tags'
     serializer_class = serializers.TagSerializer
     queryset = Tag.objects.all()
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(
+        ReplicaReadMixin, CatalogCacheMixin, SerializeTimingMixin,
+        viewsets.ReadOnlyModelViewSet):
     """Класс-контроллер модели ингредиент."""
+    catalog = 'ingredients'
+    cache_params = ('name', )
     serializer_class = serializers.IngredientSerializer
     queryset = Ingredient.objects.all()
-    filter_backends = (filters.IngredientSearchFilter, )
-    search_fields = ('^name',)
 
+    def get_cache_params(self, request):
+        """Поиск не различает регистр и пробелы по краям запроса."""
+        return [name.strip().lower() for name in super().get_cache_params(
+            request)]
+
+    def search(self, request, *args, **kwargs):
+        """Метод поиска ингредиентов по названию без обращения к базе."""
+        with measure_serialization(request):
+            data = ingredient_index.search(
+                request.query_params.get('name', ''))
+        return Response(data)
 
-class RecipeViewSet(viewsets.ModelViewSet):
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(request, self.search)
+
+
+class RecipeViewSet(
+        ReplicaReadMixin, SerializeTimingMixin, viewsets.ModelViewSet):
     """Класс-контроллер модели рецепт."""
     serializer_class = serializers.RecipeSerializer
-    queryset = Recipe.objects.all()
+    queryset = Recipe.objects.select_related('author').prefetch_related(
+        'tags',
+        Prefetch(
+            'recipeingredients',
+            queryset=RecipeIngredient.objects.select_related('ingredient')))
     pagination_class = PageLimitPagination
     filter_class = filters.RecipeFilter
     permission_classes = (IsAuthorOrReadOnly, )
+    lookup_value_regex = r'\d+'
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    def use_fast_serializers(self):
+        return settings.FAST_READ_SERIALIZERS
+
+    def list(self, request, *args, **kwargs):
+        """
+        При включенном FAST_READ_SERIALIZERS список собирается из строк
+        values() без сериализаторов на каждый рецепт.
+        """
+        if not self.use_fast_serializers():
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(
+            self.get_queryset()).prefetch_related(None).values(
+                *fast_serializers.RECIPE_VALUES)
+        page = self.paginate_queryset(queryset)
+        with measure_serialization(request):
+            data = fast_serializers.serialize_recipes(
+                queryset if page is None else page, request)
+        if page is None:
+            return Response(data)
+        return self.get_paginated_response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        if not self.use_fast_serializers():
+            return super().retrieve(request, *args, **kwargs)
+        row = generics.get_object_or_404(
+            self.get_queryset().prefetch_related(None).values(
+                *fast_serializers.RECIPE_VALUES),
+            **{self.lookup_field: kwargs[self.lookup_field]})
+        with measure_serialization(request):
+            data = fast_serializers.serialize_recipes([row], request)
+        if not data:
+            raise Http404
+        return Response(data[0])
+
     def get_serializer_class(self):
         if self.request.method == 'GET':
             return serializers.RecipeSerializer
@@ -91,33 +223,38 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     def create_del_obj(self, request, pk, database):
         """Вспомогательный метод создания объекта избранного/списка покупок."""
-        recipe = get_object_or_404(Recipe, id=pk)
         if request.method == 'POST':
-            if not database.objects.filter(
-                    user=self.request.user,
-                    recipe=recipe).exists():
-                database.objects.create(
-                    user=self.request.user,
-                    recipe=recipe)
-                serializer = serializers.PartialRecipeSerializer(recipe)
-                return Response(serializer.data,
-                                status=status.HTTP_201_CREATED)
+            recipe = get_object_or_404(Recipe, id=pk)
+            if relations.add_recipes(database, request.user, [recipe.id]):
+                with measure_serialization(request):
+                    data = serializers.PartialRecipeSerializer(recipe).data
+                return Response(data, status=status.HTTP_201_CREATED)
             text = 'errors: Объект уже в списке.'
             return Response(text, status=status.HTTP_400_BAD_REQUEST)
         if request.method == 'DELETE':
-            if database.objects.filter(
-                    user=self.request.user,
-                    recipe=recipe).exists():
-                database.objects.filter(
-                    user=self.request.user,
-                    recipe=recipe).delete()
+            if relations.remove_recipes(database, request.user, [int(pk)]):
                 return Response(status=status.HTTP_204_NO_CONTENT)
+            get_object_or_404(Recipe, id=pk)
             text = 'errors: Объект не в списке.'
             return Response(text, status=status.HTTP_400_BAD_REQUEST)
         else:
             text = 'errors: Метод обращения недопустим.'
             return Response(text, status=status.HTTP_400_BAD_REQUEST)
 
+    def bulk_create_del_obj(self, request, database):
+        """Вспомогательный метод массового добавления/удаления рецептов."""
+        serializer = serializers.RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipes = serializer.validated_data['recipes']
+        if request.method == 'POST':
+            return Response(
+                {'added': relations.add_recipes(
+                    database, request.user, recipes)},
+                status=status.HTTP_201_CREATED)
+        return Response(
+            {'removed': relations.remove_recipes(
+                database, request.user, recipes)})
+
     @action(
         methods=['post', 'delete'], detail=True,
         permission_classes=(permissions.IsAuthenticated, ))
@@ -125,6 +262,14 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """Метод эндпоинта добавления/удаления рецепта из списка избранного."""
         return self.create_del_obj(request, pk, Favorite)
 
+    @action(
+        methods=['post', 'delete'], detail=False, url_path='favorite',
+        url_name='favorite-bulk',
+        permission_classes=(permissions.IsAuthenticated, ))
+    def favorite_bulk(self, request):
+        """Метод эндпоинта массового добавления/удаления избранного."""
+        return self.bulk_create_del_obj(request, Favorite)
+
     @action(
         methods=['post', 'delete'], detail=True,
         permission_classes=(permissions.IsAuthenticated, ),)
@@ -132,10 +277,80 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """Метод эндпоинта добавления/удаления рецепта из списка покупок."""
         return self.create_del_obj(request, pk, ShoppingCart)
 
+    @action(
+        methods=['post', 'delete'], detail=False, url_path='shopping_cart',
+        url_name='shopping-cart-bulk',
+        permission_classes=(permissions.IsAuthenticated, ))
+    def shopping_cart_bulk(self, request):
+        """Метод эндпоинта массового добавления/удаления рецептов корзины."""
+        return self.bulk_create_del_obj(request, ShoppingCart)
+
+    @action(
+        methods=['get'], detail=False,
+        permission_classes=(permissions.IsAuthenticated, ))
+    def feed(self, request):
+        """
+        Метод эндпоинта ленты подписок: новые рецепты авторов, на
+        которых подписан пользователь, с пагинацией по ключу.
+        """
+        queryset = self.get_queryset().filter(
+            get_feed_filter(request.user))
+        paginator = FeedPagination()
+        if not self.use_fast_serializers():
+            page = paginator.paginate_queryset(queryset, request, self)
+            with measure_serialization(request):
+                data = self.get_serializer(page, many=True).data
+            return paginator.get_paginated_response(data)
+        page = paginator.paginate_queryset(
+            queryset.prefetch_related(None).values(
+                *fast_serializers.RECIPE_VALUES), request, self)
+        with measure_serialization(request):
+            data = fast_serializers.serialize_recipes(page, request)
+        return paginator.get_paginated_response(data)
+
+    @action(methods=['get'], detail=True)
+    def similar(self, request, pk):
+        """
+        Метод эндпоинта похожих рецептов: соседи рецепта заранее
+        посчитаны в SimilarRecipe и читаются одним запросом по индексу.
+        """
+        recipes = Recipe.objects.filter(
+            similar_to__recipe_id=pk
+        ).order_by('-similar_to__score', '-id').only(
+            'id', 'name', 'image', 'thumbnail', 'cooking_time')
+        with measure_serialization(request):
+            data = serializers.PartialRecipeSerializer(
+                recipes, many=True).data
+        if not data:
+            get_object_or_404(Recipe, id=pk)
+        return Response(data)
+
     @action(
         methods=['get'], detail=False,
         permission_classes=(permissions.IsAuthenticated, ))
     def download_shopping_cart(self, request):
         """Метод эндпоинта скачивания списка покупок."""
-        user = request.user
-        return shopping_list.get_ingredients_for_shopping(user)
+        file_format = request.query_params.get('file_format', 'txt')
+        if file_format not in shopping_list.SHOPPING_LIST_FORMATS:
+            text = 'errors: Формат файла не поддерживается.'
+            return Response(text, status=status.HTTP_400_BAD_REQUEST)
+        return shopping_list.get_ingredients_for_shopping(
+            request.user, file_format)
+
+
+class MetricsView(APIView):
+    """Гистограммы времени запросов в формате Prometheus для персонала."""
+    permission_classes = (permissions.IsAdminUser, )
+
+    def get(self, request):
+        return HttpResponse(
+            render_metrics(), content_type='text/plain; version=0.0.4')
+
+
+class HealthView(APIView):
+    """Проверка работоспособности процесса без обращения к базе."""
+    authentication_classes = ()
+    permission_classes = (permissions.AllowAny, )
+
+    def get(self, request):
+        return Response({'status': 'ok'})
@@ -30,6 +30,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -66,10 +67,40 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', default='admin'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='admin'),
         'HOST': os.getenv('DB_HOST', default='db'),
-        'PORT': os.getenv('DB_PORT', default='5432')
+        'PORT': os.getenv('DB_PORT', default='5432'),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', default=60)),
     }
 }
 
+REPLICA_DATABASES = []
+for index, location in enumerate(
+        filter(None, os.getenv('DB_REPLICAS', default='').split(','))):
+    replica = dict(DATABASES['default'], TEST={'MIRROR': 'default'})
+    if replica['ENGINE'].endswith('sqlite3'):
+        replica['NAME'] = location
+    else:
+        replica['HOST'], _, port = location.partition(':')
+        replica['PORT'] = port or replica['PORT']
+    DATABASES[f'replica_{index}'] = replica
+    REPLICA_DATABASES.append(f'replica_{index}')
+DATABASE_ROUTERS = ['api.replicas.ReplicaRouter']
+READ_YOUR_WRITES_TIMEOUT = int(os.getenv('READ_YOUR_WRITES_TIMEOUT', default=10))
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', default='django_redis.cache.RedisCache'),
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION', default='redis://redis:6379/1'),
+    }
+}
+CATALOG_CACHE_ALIAS = 'default'
+VIEWER_STATE_TIMEOUT = int(os.getenv('VIEWER_STATE_TIMEOUT', default=3600))
+CATALOG_CACHE_TIMEOUT = int(os.getenv('CATALOG_CACHE_TIMEOUT', default=86400))
+AUTH_TOKEN_CACHE_ALIAS = os.getenv('AUTH_TOKEN_CACHE_ALIAS', default='default')
+AUTH_TOKEN_CACHE_TIMEOUT = int(
+    os.getenv('AUTH_TOKEN_CACHE_TIMEOUT', default=300))
+
 AUTH_USER_MODEL = 'users.User'
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -106,13 +137,40 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
     ],
 }
 PAGE_SIZE = 6
+SEARCH_CONFIG = 'russian'
+PAGINATION_COUNT_CACHE_TIMEOUT = 60
+INGREDIENTS_SEARCH_LIMIT = 50
+BULK_RELATIONS_LIMIT = 100
+SIMILAR_RECIPES_COUNT = 10
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', default=10000))
+FEED_BACKFILL_SIZE = 100
+SIMILAR_RECIPES_MAX_POSTINGS = int(
+    os.getenv('SIMILAR_RECIPES_MAX_POSTINGS', default=1000))
+FAST_READ_SERIALIZERS = os.getenv(
+    'FAST_READ_SERIALIZERS', default='False') == 'True'
+RECIPE_FRAGMENT_CACHE_TIMEOUT = int(
+    os.getenv('RECIPE_FRAGMENT_CACHE_TIMEOUT', default=0))
+RECIPE_FRAGMENT_LOCK_TIMEOUT = 10
+RECIPE_FRAGMENT_LOCK_WAIT = 0.5
+SLOW_REQUEST_THRESHOLD = int(os.getenv('SLOW_REQUEST_THRESHOLD', default=500))
+SLOW_REQUEST_QUERIES = int(os.getenv('SLOW_REQUEST_QUERIES', default=50))
+SLOW_REQUEST_LOGGED_QUERIES = 3
+METRICS_DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+METRICS_QUERIES_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+RECIPE_THUMBNAIL_SIZE = (480, 480)
+RECIPE_THUMBNAIL_QUALITY = 80
+IMAGE_PROCESSING_WORKERS = int(os.getenv('IMAGE_PROCESSING_WORKERS', default=2))
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf')
 
 DJOSER = {
     "HIDE_USERS": False,
@@ -0,0 +1,20 @@
+import multiprocessing
+import os
+
+# Несколько процессов согласованы только при общем кэше: в LocMemCache
+# сбросы версий справочников и фрагментов видит один воркер.
+SHARED_CACHE = os.getenv(
+    'CACHE_BACKEND', default='django_redis.cache.RedisCache'
+) != 'django.core.cache.backends.locmem.LocMemCache'
+
+bind = os.getenv('GUNICORN_BIND', default='0:8000')
+workers = int(os.getenv(
+    'GUNICORN_WORKERS',
+    default=multiprocessing.cpu_count() * 2 + 1 if SHARED_CACHE else 1))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', default='gthread')
+threads = int(os.getenv('GUNICORN_THREADS', default=4))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', default=30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', default=5))
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', default=1000))
+max_requests_jitter = int(os.getenv(
+    'GUNICORN_MAX_REQUESTS_JITTER', default=100))
@@ -64,3 +64,28 @@ class ShoppingCartAdmin(admin.ModelAdmin):
     list_display = ('user', 'recipe', )
     list_filter = ('user', 'recipe', )
     search_fields = ('user', 'recipe', )
+
+
+@admin.register(models.ShoppingListIngredient)
+class ShoppingListIngredientAdmin(admin.ModelAdmin):
+    """Класс админки для модели списка покупок."""
+    model = models.ShoppingListIngredient
+    list_display = ('user', 'ingredient', 'amount', )
+    list_filter = ('user', )
+    search_fields = ('user__username', 'ingredient__name', )
+
+
+@admin.register(models.FeedEntry)
+class FeedEntryAdmin(admin.ModelAdmin):
+    """Класс админки для модели ленты подписок."""
+    model = models.FeedEntry
+    list_display = ('user', 'recipe', 'author', )
+    search_fields = ('user__username', )
+
+
+@admin.register(models.SimilarRecipe)
+class SimilarRecipeAdmin(admin.ModelAdmin):
+    """Класс админки для модели похожих рецептов."""
+    model = models.SimilarRecipe
+    list_display = ('recipe', 'similar', 'score', )
+    search_fields = ('recipe__name', )
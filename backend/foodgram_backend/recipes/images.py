@@ -0,0 +1,80 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import Image
+
+THUMBNAIL_DIR = 'recipe/thumbnails'
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def get_thumbnail_name(image_name):
+    """Имя миниатюры однозначно определяется именем исходного файла."""
+    name = os.path.splitext(os.path.basename(image_name))[0]
+    return f'{THUMBNAIL_DIR}/{name}.webp'
+
+
+def make_thumbnail(image_name):
+    """
+    Создает уменьшенную копию изображения в формате WebP. Копия одна,
+    размера RECIPE_THUMBNAIL_SIZE: ее используют и список, и карточка
+    рецепта, а страница рецепта показывает исходное изображение.
+    """
+    thumbnail_name = get_thumbnail_name(image_name)
+    if default_storage.exists(thumbnail_name):
+        return thumbnail_name
+    from recipes.models import Recipe
+    with Recipe._meta.get_field('image').storage.open(image_name) as file:
+        with Image.open(file) as image:
+            image.thumbnail(settings.RECIPE_THUMBNAIL_SIZE)
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA')
+            buffer = BytesIO()
+            image.save(
+                buffer, 'WEBP', quality=settings.RECIPE_THUMBNAIL_QUALITY)
+    saved_name = default_storage.save(
+        thumbnail_name, ContentFile(buffer.getvalue()))
+    if saved_name != thumbnail_name:
+        default_storage.delete(saved_name)
+    return thumbnail_name
+
+
+def process_recipe_image(recipe_id, image_name):
+    from api.fragments import bump_recipe_fragments
+    from recipes.models import Recipe
+    try:
+        thumbnail_name = make_thumbnail(image_name)
+        if Recipe.objects.filter(id=recipe_id, image=image_name).update(
+                thumbnail=thumbnail_name):
+            bump_recipe_fragments([recipe_id])
+    except Exception:
+        logger.exception('Не удалось обработать изображение %s', image_name)
+    finally:
+        if _executor is not None:
+            connections.close_all()
+
+
+def schedule_recipe_image_processing(recipe_id, image_name):
+    """
+    Ставит обработку изображения в фоновый пул потоков после фиксации
+    транзакции; при IMAGE_PROCESSING_WORKERS = 0 обрабатывает сразу.
+    """
+    global _executor
+    if not settings.IMAGE_PROCESSING_WORKERS:
+        transaction.on_commit(
+            lambda: process_recipe_image(recipe_id, image_name))
+        return
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_PROCESSING_WORKERS,
+            thread_name_prefix='recipe-images')
+    transaction.on_commit(
+        lambda: _executor.submit(process_recipe_image, recipe_id, image_name))
@@ -0,0 +1,267 @@
+import json
+import time
+import tracemalloc
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from users.models import Subscription, User
+from .generate_data_manager import DEFAULT_PASSWORD, PIXEL_PNG
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks every API endpoint through the test client and saves '
+        'p50/p95 latency, query count and allocated memory as JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument(
+            '--user', help='email пользователя, от имени которого идут '
+                           'запросы; по умолчанию - самый активный')
+        parser.add_argument('--password', default=DEFAULT_PASSWORD)
+        parser.add_argument('--output', help='файл для результатов в JSON')
+        parser.add_argument(
+            '--compare', help='JSON предыдущего запуска для сравнения')
+        parser.add_argument('--label', default='', help='метка запуска')
+        parser.add_argument(
+            '--reconnect', action='store_true',
+            help='открывать новое соединение с базой на каждый запрос, '
+                 'как при CONN_MAX_AGE=0')
+
+    def get_user(self):
+        if self.options['user']:
+            return User.objects.get(email=self.options['user'])
+        user = User.objects.order_by(
+            '-subscribers_count', '-recipes_count').filter(
+                recipes_count__gt=0, shoppingcarts__isnull=False,
+                subscriber__isnull=False).first()
+        if user is None:
+            raise CommandError(
+                'Нет данных для замера, запустите generate_data_manager')
+        return user
+
+    def get_scenarios(self, user):
+        """
+        Пары (имя, запрос) по всем эндпоинтам api/urls.py. Изменяющие
+        запросы идут парами, которые возвращают базу в исходное
+        состояние.
+        """
+        recipe = Recipe.objects.exclude(author=user).first()
+        own_recipe = Recipe.objects.filter(author=user).first()
+        last_page = max(Recipe.objects.count() // settings.PAGE_SIZE, 1)
+        author = User.objects.exclude(id=user.id).exclude(
+            id__in=Subscription.objects.filter(
+                user=user).values('author')).first()
+        tag = Tag.objects.first()
+        ingredient = Ingredient.objects.first()
+        free_recipe = Recipe.objects.exclude(
+            id__in=Favorite.objects.filter(user=user).values('recipe')
+        ).exclude(
+            id__in=ShoppingCart.objects.filter(user=user).values('recipe')
+        ).first()
+        recipe_data = {
+            'name': 'Замер', 'text': 'Рецепт для замера', 'cooking_time': 10,
+            'tags': [tag.id],
+            'ingredients': [{'id': ingredient.id, 'amount': 10}],
+            'image': 'data:image/png;base64,' + PIXEL_PNG,
+        }
+        scenarios = [
+            ('users-list', 'get', '/api/users/', None),
+            ('users-detail', 'get', f'/api/users/{author.id}/', None),
+            ('users-me', 'get', '/api/users/me/', None),
+            ('users-subscriptions', 'get', '/api/users/subscriptions/', None),
+            ('users-subscribe', 'post',
+             f'/api/users/{author.id}/subscribe/', None),
+            ('users-unsubscribe', 'delete',
+             f'/api/users/{author.id}/subscribe/', None),
+            ('users-subscribe-bulk', 'post', '/api/users/subscribe/',
+             {'authors': [author.id]}),
+            ('users-unsubscribe-bulk', 'delete', '/api/users/subscribe/',
+             {'authors': [author.id]}),
+            ('users-set-password', 'post', '/api/users/set_password/', {
+                'current_password': self.options['password'],
+                'new_password': self.options['password']}),
+            ('tags-list', 'get', '/api/tags/', None),
+            ('tags-detail', 'get', f'/api/tags/{tag.id}/', None),
+            ('ingredients-list', 'get', '/api/ingredients/', None),
+            ('ingredients-search', 'get',
+             f'/api/ingredients/?name={ingredient.name[:3]}', None),
+            ('ingredients-detail', 'get',
+             f'/api/ingredients/{ingredient.id}/', None),
+            ('recipes-list', 'get', '/api/recipes/', None),
+            ('recipes-list-last-page', 'get',
+             f'/api/recipes/?page={last_page}', None),
+            ('recipes-list-cursor', 'get', '/api/recipes/?cursor=', None),
+            ('recipes-list-tags', 'get',
+             f'/api/recipes/?tags={tag.slug}', None),
+            ('recipes-list-author', 'get',
+             f'/api/recipes/?author={recipe.author_id}', None),
+            ('recipes-list-favorited', 'get',
+             '/api/recipes/?is_favorited=1', None),
+            ('recipes-list-in-cart', 'get',
+             '/api/recipes/?is_in_shopping_cart=1', None),
+            ('recipes-search', 'get',
+             f'/api/recipes/?search={recipe.name.split()[0]}', None),
+            ('recipes-detail', 'get', f'/api/recipes/{recipe.id}/', None),
+            ('recipes-feed', 'get', '/api/recipes/feed/', None),
+            ('recipes-similar', 'get',
+             f'/api/recipes/{recipe.id}/similar/', None),
+            ('recipes-favorite', 'post',
+             f'/api/recipes/{free_recipe.id}/favorite/', None),
+            ('recipes-unfavorite', 'delete',
+             f'/api/recipes/{free_recipe.id}/favorite/', None),
+            ('recipes-cart-add', 'post',
+             f'/api/recipes/{free_recipe.id}/shopping_cart/', None),
+            ('recipes-cart-remove', 'delete',
+             f'/api/recipes/{free_recipe.id}/shopping_cart/', None),
+            ('recipes-favorite-bulk', 'post', '/api/recipes/favorite/',
+             {'recipes': [free_recipe.id]}),
+            ('recipes-unfavorite-bulk', 'delete', '/api/recipes/favorite/',
+             {'recipes': [free_recipe.id]}),
+            ('recipes-cart-add-bulk', 'post', '/api/recipes/shopping_cart/',
+             {'recipes': [free_recipe.id]}),
+            ('recipes-cart-remove-bulk', 'delete',
+             '/api/recipes/shopping_cart/', {'recipes': [free_recipe.id]}),
+            ('recipes-download-cart', 'get',
+             '/api/recipes/download_shopping_cart/', None),
+            ('recipes-update', 'patch', f'/api/recipes/{own_recipe.id}/', {
+                'name': own_recipe.name,
+                'cooking_time': own_recipe.cooking_time}),
+            ('recipes-create', 'post', '/api/recipes/', recipe_data),
+            ('recipes-delete', 'delete', '/api/recipes/{created}/', None),
+            ('auth-login', 'post', '/api/auth/token/login/', {
+                'email': user.email, 'password': self.options['password']}),
+            ('auth-logout', 'post', '/api/auth/token/logout/', None),
+            ('users-create', 'post', '/api/users/', {
+                'email': 'signup-check@example.com',
+                'username': 'signup_check', 'first_name': 'Имя',
+                'last_name': 'Фамилия',
+                'password': self.options['password']}),
+            ('health', 'get', '/api/health', None),
+        ]
+        return scenarios
+
+    def run_scenario(self, client, method, url, data):
+        """Один запрос: время, число запросов к базе и ответ."""
+        with CaptureQueriesContext(connection) as queries:
+            if self.options['reconnect']:
+                connection.close()
+            started = time.perf_counter()
+            response = getattr(client, method)(url, data, format='json')
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - started
+        return response, elapsed, len(queries)
+
+    def authenticate(self, client, user):
+        token, _ = Token.objects.get_or_create(user=user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def after_response(self, name, response, client, user, data):
+        """Подготовка следующих запросов пары и уборка за сценарием."""
+        if name == 'recipes-create':
+            self.created = response.data['id']
+        elif name == 'auth-login':
+            client.credentials(
+                HTTP_AUTHORIZATION=f'Token {response.data["auth_token"]}')
+        elif name == 'auth-logout':
+            self.authenticate(client, user)
+        elif name == 'users-create':
+            User.objects.filter(email=data['email']).delete()
+
+    def run_all(self, user, scenarios, record=None, trace=False):
+        client = APIClient()
+        self.authenticate(client, user)
+        self.created = None
+        for name, method, url, data in scenarios:
+            url = url.format(created=self.created)
+            if trace:
+                tracemalloc.start()
+            response, elapsed, queries = self.run_scenario(
+                client, method, url, data)
+            if trace:
+                memory = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            if response.status_code >= 400:
+                raise CommandError(
+                    f'{name}: {method.upper()} {url} вернул '
+                    f'{response.status_code}: '
+                    f'{response.content.decode()[:300]}')
+            self.after_response(name, response, client, user, data)
+            if record is None:
+                continue
+            result = record.setdefault(name, {
+                'method': method.upper(), 'path': url,
+                'status': response.status_code, 'timings': [],
+                'queries': queries})
+            if trace:
+                result['memory_kb'] = round(memory / 1024, 1)
+            else:
+                result['timings'].append(elapsed * 1000)
+
+    def compare(self, results, path):
+        with open(path, 'r', encoding='utf-8') as file:
+            baseline = json.load(file)['results']
+        self.stdout.write(f'Сравнение с {path}:')
+        for name, result in results.items():
+            if name not in baseline:
+                continue
+            old = baseline[name]
+            ratio = result['p50_ms'] / old['p50_ms'] if old['p50_ms'] else 0
+            self.stdout.write(
+                f'{name:28} p50 {old["p50_ms"]:8.2f} -> '
+                f'{result["p50_ms"]:8.2f} мс ({ratio:5.2f}x), '
+                f'запросов {old["queries"]} -> {result["queries"]}')
+
+    def handle(self, *args, **options):
+        self.options = options
+        user = self.get_user()
+        scenarios = self.get_scenarios(user)
+        for _ in range(options['warmup']):
+            self.run_all(user, scenarios)
+        record = {}
+        for _ in range(options['iterations']):
+            self.run_all(user, scenarios, record)
+        self.run_all(user, scenarios, record, trace=True)
+
+        results = {}
+        for name, result in record.items():
+            timings = result.pop('timings')
+            result['p50_ms'] = round(percentile(timings, 0.5), 3)
+            result['p95_ms'] = round(percentile(timings, 0.95), 3)
+            results[name] = result
+            self.stdout.write(
+                f'{name:28} p50 {result["p50_ms"]:8.2f} мс  '
+                f'p95 {result["p95_ms"]:8.2f} мс  '
+                f'запросов {result["queries"]:3}  '
+                f'память {result["memory_kb"]:8.1f} КБ')
+        report = {
+            'label': options['label'],
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'database': connection.vendor,
+            'iterations': options['iterations'],
+            'reconnect': options['reconnect'],
+            'recipes': Recipe.objects.count(),
+            'users': User.objects.count(),
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+            self.stdout.write(f'Результаты сохранены в {options["output"]}')
+        if options['compare']:
+            self.compare(results, options['compare'])
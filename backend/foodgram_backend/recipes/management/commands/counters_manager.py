@@ -0,0 +1,42 @@
+from django.core.management import BaseCommand
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Subscription, User
+
+
+def count_subquery(queryset, field):
+    return Coalesce(Subquery(queryset.filter(**{
+        field: OuterRef('pk')
+    }).order_by().values(field).annotate(
+        total=Count('id')).values('total')), 0)
+
+
+class Command(BaseCommand):
+    help = 'Reconciles denormalized recipe and user counters'
+
+    def reconcile(self, queryset, counter_field, actual):
+        """Исправляет значения счетчика, разошедшиеся с реальными."""
+        drifted = queryset.annotate(actual=actual).exclude(
+            **{counter_field: F('actual')}).count()
+        if drifted:
+            queryset.update(**{counter_field: actual})
+        self.stdout.write(
+            f'{queryset.model.__name__}.{counter_field}: '
+            f'исправлено {drifted}')
+
+    def handle(self, *args, **options):
+        self.reconcile(
+            Recipe.objects.all(), 'favorites_count',
+            count_subquery(Favorite.objects.all(), 'recipe'))
+        self.reconcile(
+            Recipe.objects.all(), 'shopping_carts_count',
+            count_subquery(ShoppingCart.objects.all(), 'recipe'))
+        self.reconcile(
+            User.objects.all(), 'recipes_count',
+            count_subquery(Recipe.objects.all(), 'author'))
+        self.reconcile(
+            User.objects.all(), 'subscribers_count',
+            count_subquery(Subscription.objects.all(), 'author'))
+        self.stdout.write(self.style.SUCCESS('Счетчики сверены'))
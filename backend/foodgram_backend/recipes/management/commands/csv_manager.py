@@ -1,23 +1,106 @@
 import csv
+import json
+import os
 
 from django.conf import settings
-from django.core.management import BaseCommand
+from django.core.management import BaseCommand, CommandError
 
+from api.catalog import bump_catalog_version
 from recipes.models import Ingredient
 
+CHUNK_SIZE = 64 * 1024
+SEPARATORS = frozenset(' \t\n\r,')
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if row:
+            name, measurement_unit = row
+            yield name, measurement_unit
+
+
+def read_json(file):
+    """
+    Построчно разбирает JSON-массив, не загружая файл целиком. Разбор
+    идет по индексу в буфере, а прочитанное отрезается только перед
+    добавлением следующего блока.
+    """
+    decoder = json.JSONDecoder()
+    buffer = file.read(CHUNK_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('Ожидался JSON-массив ингредиентов.')
+    index = 1
+    while True:
+        while index < len(buffer) and buffer[index] in SEPARATORS:
+            index += 1
+        if buffer.startswith(']', index):
+            return
+        try:
+            item, index = decoder.raw_decode(buffer, index)
+        except ValueError:
+            chunk = file.read(CHUNK_SIZE)
+            if not chunk:
+                raise CommandError('Некорректный JSON-файл.')
+            buffer = buffer[index:] + chunk
+            index = 0
+            continue
+        yield item['name'], item['measurement_unit']
+
+
+READERS = {
+    '.csv': read_csv,
+    '.json': read_json,
+}
+
 
 class Command(BaseCommand):
+    help = 'Loads ingredients from a CSV or JSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default=os.path.join(settings.BASE_DIR, 'data', 'ingredients.csv'),
+            help='Путь к файлу ингредиентов в формате CSV или JSON.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Прочитать файл, ничего не записывая в базу.')
+        parser.add_argument(
+            '--progress', action='store_true',
+            help='Выводить прогресс после каждой пачки.')
+
+    def save_batch(self, batch, options):
+        if not options['dry_run']:
+            Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
 
     def handle(self, *args, **options):
-        with open(
-            f'{settings.BASE_DIR}/data/ingredients.csv',
-            'r',
-            encoding='utf-8',
-        ) as file:
-            file_reader = csv.reader(file)
-            for row in file_reader:
-                name, measurement_unit = row
-                Ingredient.objects.get_or_create(
-                    name=name,
-                    measurement_unit=measurement_unit)
-        self.stdout.write(self.style.SUCCESS('Все ингридиенты загружены!'))
+        path = options['path']
+        reader = READERS.get(os.path.splitext(path)[1].lower())
+        if reader is None:
+            raise CommandError('Поддерживаются только файлы CSV и JSON.')
+        count_before = Ingredient.objects.count()
+        seen = set()
+        batch = []
+        with open(path, 'r', encoding='utf-8') as file:
+            for name, measurement_unit in reader(file):
+                key = (name.strip(), measurement_unit.strip())
+                if key in seen:
+                    continue
+                seen.add(key)
+                batch.append(
+                    Ingredient(name=key[0], measurement_unit=key[1]))
+                if len(batch) >= options['batch_size']:
+                    self.save_batch(batch, options)
+                    batch = []
+                    if options['progress']:
+                        self.stdout.write(f'Обработано: {len(seen)}')
+        self.save_batch(batch, options)
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Прочитано уникальных ингредиентов: {len(seen)}'))
+            return
+        bump_catalog_version('ingredients')
+        created = Ingredient.objects.count() - count_before
+        self.stdout.write(self.style.SUCCESS(
+            f'Все ингридиенты загружены! Новых: {created}, '
+            f'уже было: {len(seen) - created}'))
@@ -0,0 +1,72 @@
+import datetime
+import os
+
+from django.core.management import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+
+from recipes.models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart, Tag)
+from users.models import Subscription, User
+
+# Модели в порядке зависимостей: каждая ссылается только на предыдущие.
+MODELS = (
+    User, Tag, Ingredient, Recipe, Recipe.tags.through, RecipeIngredient,
+    Subscription, Favorite, ShoppingCart,
+)
+# Поля, которые пересчитываются после загрузки.
+DERIVED_FIELDS = ('search_vector', )
+
+
+class JSONLinesEncoder(DjangoJSONEncoder):
+    """В отличие от DjangoJSONEncoder не отбрасывает микросекунды."""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def get_fields(model):
+    return [
+        field.attname for field in model._meta.concrete_fields
+        if field.name not in DERIVED_FIELDS
+    ]
+
+
+def get_path(directory, model):
+    return os.path.join(directory, f'{model._meta.label_lower}.jsonl')
+
+
+class Command(BaseCommand):
+    help = (
+        'Streams users, recipes, subscriptions, favorites and carts '
+        'into per-model JSON Lines files'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'directory', help='Папка, в которую пишутся файлы моделей.')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def export(self, model, path, batch_size):
+        """Пишет строки модели по одной, читая базу пачками."""
+        fields = get_fields(model)
+        encoder = JSONLinesEncoder(ensure_ascii=False)
+        total = 0
+        rows = model.objects.order_by('pk').values_list(*fields).iterator(
+            chunk_size=batch_size)
+        with open(path, 'w', encoding='utf-8') as file:
+            for row in rows:
+                file.write(encoder.encode(dict(zip(fields, row))))
+                file.write('\n')
+                total += 1
+        self.stdout.write(f'{model._meta.label}: {total}')
+
+    def handle(self, *args, **options):
+        directory = options['directory']
+        os.makedirs(directory, exist_ok=True)
+        for model in MODELS:
+            self.export(
+                model, get_path(directory, model), options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Данные выгружены в {directory}'))
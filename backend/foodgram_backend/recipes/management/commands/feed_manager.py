@@ -0,0 +1,11 @@
+from django.core.management import BaseCommand
+
+from api.feed import rebuild_feeds
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds subscription feed timelines from subscriptions'
+
+    def handle(self, *args, **options):
+        rebuild_feeds()
+        self.stdout.write(self.style.SUCCESS('Ленты подписок пересобраны'))
@@ -0,0 +1,217 @@
+import base64
+import random
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management import BaseCommand, CommandError, call_command
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+
+from api.caches import clear_data_caches
+from api.catalog import bump_catalog_version
+from api.feed import rebuild_feeds
+from api.search import rebuild_search_index
+from api.shopping_list import rebuild_shopping_lists
+from api.similar import rebuild_similar_recipes
+from recipes.models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart, Tag,
+    get_tag_mask)
+from users.models import Subscription, User
+
+DEFAULT_PASSWORD = 'benchmark-password'
+PIXEL_PNG = (
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAQMAAAAl21bKAAAAA1BMVEUAAACnej3aAAAAAXRS'
+    'TlMAQObYZgAAAApJREFUCNdjYAAAAAIAAeIhvDMAAAAASUVORK5CYII='
+)
+DISHES = (
+    'суп', 'салат', 'пирог', 'рагу', 'омлет', 'каша', 'запеканка', 'соус',
+    'плов', 'борщ', 'пицца', 'паста', 'котлеты', 'блины', 'десерт',
+)
+ADJECTIVES = (
+    'домашний', 'быстрый', 'летний', 'зимний', 'острый', 'легкий',
+    'сытный', 'праздничный', 'бабушкин', 'овощной', 'пряный', 'нежный',
+)
+WORDS = (
+    'нарезать', 'смешать', 'обжарить', 'запечь', 'варить', 'посолить',
+    'добавить', 'тесто', 'духовка', 'сковорода', 'минут', 'огонь', 'масло',
+    'подавать', 'горячим', 'остудить', 'взбить', 'мелко', 'кастрюля',
+)
+AMOUNTS = (1, 2, 3, 5, 10, 50, 100, 150, 200, 250, 500)
+
+
+def get_zipf_weights(size, exponent=1.1):
+    """Накопленные веса распределения Ципфа для random.choices."""
+    return list(accumulate(
+        1 / rank ** exponent for rank in range(1, size + 1)))
+
+
+class Command(BaseCommand):
+    help = (
+        'Generates a reproducible synthetic dataset of users, recipes, '
+        'favorites, carts and subscriptions for benchmarking'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument(
+            '--users', type=int,
+            help='по умолчанию - десятая часть количества рецептов')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--prefix', default='bench',
+            help='префикс имен создаваемых пользователей')
+        parser.add_argument('--favorites', type=float, default=10,
+                            help='среднее число избранных у пользователя')
+        parser.add_argument('--carts', type=float, default=3,
+                            help='среднее число рецептов в корзине')
+        parser.add_argument('--subscriptions', type=float, default=5,
+                            help='среднее число подписок у пользователя')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def save(self, model, objects):
+        """Сохраняет объекты партиями, каждую в своей транзакции."""
+        batch_size = self.options['batch_size']
+        total = 0
+        batch = []
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) >= batch_size:
+                with transaction.atomic():
+                    model.objects.bulk_create(batch)
+                total += len(batch)
+                batch = []
+        with transaction.atomic():
+            model.objects.bulk_create(batch)
+        total += len(batch)
+        self.stdout.write(f'{model.__name__}: {total}')
+
+    def get_count(self, mean):
+        return int(self.random.expovariate(1 / mean)) if mean > 0 else 0
+
+    def sample(self, population, weights, count):
+        """До count различных элементов с весами популярности."""
+        if not population or not count:
+            return set()
+        return set(self.random.choices(
+            population, cum_weights=weights, k=count))
+
+    def generate_users(self, first_id, count):
+        password = make_password(DEFAULT_PASSWORD)
+        prefix = self.options['prefix']
+        for index in range(count):
+            yield User(
+                id=first_id + index,
+                username=f'{prefix}{index}',
+                email=f'{prefix}{index}@example.com',
+                first_name='Имя',
+                last_name='Фамилия',
+                password=password,
+            )
+
+    def generate_recipes(self, first_id, count, user_ids, tag_ids, image):
+        author_weights = get_zipf_weights(len(user_ids))
+        for index in range(count):
+            recipe_id = first_id + index
+            name = (f'{self.random.choice(ADJECTIVES).capitalize()} '
+                    f'{self.random.choice(DISHES)} {recipe_id}')
+            self.recipe_tags[recipe_id] = self.random.sample(
+                tag_ids, self.random.randint(1, min(3, len(tag_ids))))
+            yield Recipe(
+                id=recipe_id,
+                author_id=self.random.choices(
+                    user_ids, cum_weights=author_weights)[0],
+                name=name,
+                text=' '.join(self.random.choices(
+                    WORDS, k=self.random.randint(10, 60))),
+                cooking_time=self.random.randint(5, 180),
+                image=image,
+                tag_mask=get_tag_mask(self.recipe_tags[recipe_id]),
+            )
+
+    def generate_tags(self):
+        through = Recipe.tags.through
+        for recipe_id, tag_ids in self.recipe_tags.items():
+            for tag_id in tag_ids:
+                yield through(recipe_id=recipe_id, tag_id=tag_id)
+
+    def generate_ingredients(self, recipe_ids, ingredient_ids):
+        weights = get_zipf_weights(len(ingredient_ids))
+        for recipe_id in recipe_ids:
+            for ingredient_id in self.sample(
+                    ingredient_ids, weights, self.random.randint(3, 12)):
+                yield RecipeIngredient(
+                    recipe_id=recipe_id, ingredient_id=ingredient_id,
+                    amount=self.random.choice(AMOUNTS))
+
+    def generate_relations(self, model, field, user_ids, targets, mean):
+        """Связи пользователей с популярными рецептами или авторами."""
+        targets = list(targets)
+        self.random.shuffle(targets)
+        weights = get_zipf_weights(len(targets))
+        for user_id in user_ids:
+            for target in self.sample(
+                    targets, weights, self.get_count(mean)):
+                if field == 'author_id' and target == user_id:
+                    continue
+                yield model(user_id=user_id, **{field: target})
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.random = random.Random(options['seed'])
+        self.recipe_tags = {}
+        recipes_count = options['recipes']
+        users_count = options['users'] or max(recipes_count // 10, 10)
+        if User.objects.filter(
+                username__startswith=options['prefix']).exists():
+            raise CommandError(
+                f'Пользователи с префиксом {options["prefix"]} уже есть, '
+                'укажите другой --prefix')
+        if not Ingredient.objects.exists():
+            call_command('csv_manager')
+        if not Tag.objects.exists():
+            call_command('tags_manager')
+        ingredient_ids = list(
+            Ingredient.objects.order_by('id').values_list('id', flat=True))
+        tag_ids = list(Tag.objects.order_by('id').values_list('id', flat=True))
+        image = Recipe._meta.get_field('image').storage.save(
+            'recipe/synthetic.png',
+            ContentFile(base64.b64decode(PIXEL_PNG)))
+
+        first_user = (User.objects.aggregate(Max('id'))['id__max'] or 0) + 1
+        user_ids = list(range(first_user, first_user + users_count))
+        self.save(User, self.generate_users(first_user, users_count))
+        first_recipe = (
+            Recipe.objects.aggregate(Max('id'))['id__max'] or 0) + 1
+        recipe_ids = list(range(first_recipe, first_recipe + recipes_count))
+        self.save(Recipe, self.generate_recipes(
+            first_recipe, recipes_count, user_ids, tag_ids, image))
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                    no_style(), [User, Recipe]):
+                cursor.execute(sql)
+        self.save(Recipe.tags.through, self.generate_tags())
+        self.save(RecipeIngredient, self.generate_ingredients(
+            recipe_ids, ingredient_ids))
+        self.save(Favorite, self.generate_relations(
+            Favorite, 'recipe_id', user_ids, recipe_ids,
+            options['favorites']))
+        self.save(ShoppingCart, self.generate_relations(
+            ShoppingCart, 'recipe_id', user_ids, recipe_ids,
+            options['carts']))
+        self.save(Subscription, self.generate_relations(
+            Subscription, 'author_id', user_ids, user_ids,
+            options['subscriptions']))
+
+        call_command('counters_manager', stdout=self.stdout)
+        rebuild_shopping_lists()
+        rebuild_search_index()
+        rebuild_similar_recipes()
+        rebuild_feeds()
+        clear_data_caches()
+        bump_catalog_version('tags')
+        bump_catalog_version('ingredients')
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано пользователей: {users_count}, '
+            f'рецептов: {recipes_count}, пароль: {DEFAULT_PASSWORD}'))
@@ -0,0 +1,95 @@
+import json
+import os
+
+from django.core.management import BaseCommand, CommandError, call_command
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from api.caches import clear_data_caches
+from api.catalog import bump_catalog_version
+from api.feed import rebuild_feeds
+from api.search import rebuild_search_index
+from api.shopping_list import rebuild_shopping_lists
+from api.similar import rebuild_similar_recipes
+from .export_data_manager import MODELS, get_fields, get_path
+
+
+def read_rows(file, fields):
+    """Построчно разбирает JSON Lines, не загружая файл целиком."""
+    for number, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            raise CommandError(f'{file.name}:{number}: некорректный JSON')
+        unknown = row.keys() - fields
+        if unknown:
+            raise CommandError(
+                f'{file.name}:{number}: неизвестные поля '
+                f'{", ".join(sorted(unknown))}')
+        yield row
+
+
+class Command(BaseCommand):
+    help = (
+        'Loads per-model JSON Lines files written by export_data_manager '
+        'with batched bulk_create'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'directory', help='Папка с файлами, выгруженными '
+                              'export_data_manager.')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument(
+            '--ignore-conflicts', action='store_true',
+            help='Пропускать строки, которые уже есть в базе.')
+
+    def save(self, model, batch):
+        """Сохраняет пачку в своей транзакции без сигналов моделей."""
+        with transaction.atomic():
+            model.objects.bulk_create(
+                batch, ignore_conflicts=self.options['ignore_conflicts'])
+
+    def load(self, model, path):
+        fields = set(get_fields(model))
+        batch_size = self.options['batch_size']
+        total = 0
+        batch = []
+        with open(path, encoding='utf-8') as file:
+            for row in read_rows(file, fields):
+                batch.append(model(**row))
+                if len(batch) >= batch_size:
+                    self.save(model, batch)
+                    total += len(batch)
+                    batch = []
+        if batch:
+            self.save(model, batch)
+            total += len(batch)
+        self.stdout.write(f'{model._meta.label}: {total}')
+
+    def handle(self, *args, **options):
+        self.options = options
+        directory = options['directory']
+        models = [
+            model for model in MODELS
+            if os.path.exists(get_path(directory, model))
+        ]
+        if not models:
+            raise CommandError(f'В {directory} нет файлов моделей')
+        for model in models:
+            self.load(model, get_path(directory, model))
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), models):
+                cursor.execute(sql)
+
+        call_command('counters_manager', stdout=self.stdout)
+        rebuild_shopping_lists()
+        rebuild_search_index()
+        rebuild_similar_recipes()
+        rebuild_feeds()
+        clear_data_caches()
+        bump_catalog_version('tags')
+        bump_catalog_version('ingredients')
+        self.stdout.write(self.style.SUCCESS('Данные загружены'))
@@ -0,0 +1,11 @@
+from django.core.management import BaseCommand
+
+from api.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the recipe full-text search index'
+
+    def handle(self, *args, **options):
+        rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS('Поисковый индекс пересобран'))
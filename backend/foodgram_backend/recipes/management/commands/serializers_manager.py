@@ -0,0 +1,87 @@
+import time
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.test.utils import override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.fast_serializers import RECIPE_VALUES, serialize_recipes
+from api.serializers import RecipeSerializer
+from api.views import RecipeViewSet
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Checks that the fast recipe read path renders the same JSON '
+        'as RecipeSerializer and measures CPU time per page'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, help='id пользователя, от имени которого '
+                                     'строится выдача')
+        parser.add_argument('--pages', type=int, default=20)
+        parser.add_argument(
+            '--page-size', type=int, default=settings.PAGE_SIZE)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def get_request(self, user_id):
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        if user_id is not None:
+            request.user = User.objects.get(id=user_id)
+        return request
+
+    def measure(self, render, repeat):
+        started = time.process_time()
+        for _ in range(repeat):
+            content = render()
+        return content, (time.process_time() - started) / repeat
+
+    def handle(self, *args, **options):
+        renderer = JSONRenderer()
+        queryset = RecipeViewSet.queryset
+        size = options['page_size']
+        slow_total = fast_total = 0
+        pages = 0
+        for number in range(options['pages']):
+            ids = list(queryset.values_list(
+                'id', flat=True)[number * size:(number + 1) * size])
+            if not ids:
+                break
+            page = queryset.filter(id__in=ids)
+
+            def render_slow():
+                request = self.get_request(options['user'])
+                return renderer.render(RecipeSerializer(
+                    page.all(), many=True,
+                    context={'request': request}).data)
+
+            def render_fast():
+                request = self.get_request(options['user'])
+                return renderer.render(serialize_recipes(
+                    page.prefetch_related(None).values(*RECIPE_VALUES),
+                    request))
+
+            slow, slow_time = self.measure(render_slow, options['repeat'])
+            # Фрагменты строятся из values() на каждый прогон: сравнивается
+            # сборка без сериализаторов, а не попадания в кэш.
+            with override_settings(RECIPE_FRAGMENT_CACHE_TIMEOUT=0):
+                fast, fast_time = self.measure(
+                    render_fast, options['repeat'])
+            if slow != fast:
+                raise CommandError(
+                    f'Страница {number + 1}: ответы различаются\n'
+                    f'{slow.decode()}\n{fast.decode()}')
+            slow_total += slow_time
+            fast_total += fast_time
+            pages += 1
+        if not pages:
+            raise CommandError('Нет рецептов для сравнения')
+        self.stdout.write(
+            f'Страниц: {pages}, '
+            f'сериализаторы: {slow_total / pages * 1000:.2f} мс, '
+            f'values(): {fast_total / pages * 1000:.2f} мс на страницу')
+        self.stdout.write(self.style.SUCCESS('Ответы совпадают'))
@@ -0,0 +1,53 @@
+from django.core.management import BaseCommand
+
+from api.shopping_list import (
+    get_aggregated_ingredients, get_ingredients, rebuild_shopping_lists)
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds and verifies shopping lists'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='users',
+            help='Id пользователя, список которого нужно обработать.')
+        parser.add_argument(
+            '--verify-only', action='store_true',
+            help='Только сверить списки покупок с корзинами.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    @staticmethod
+    def as_set(ingredients):
+        return {
+            (row['ingredient__name'], row['ingredient__measurement_unit'],
+             row['value'])
+            for row in ingredients
+        }
+
+    def handle(self, *args, **options):
+        user_ids = options['users']
+        if not options['verify_only']:
+            rebuild_shopping_lists(user_ids, options['batch_size'])
+            self.stdout.write(self.style.SUCCESS('Списки покупок собраны'))
+        users = User.objects.all()
+        if user_ids is not None:
+            users = users.filter(id__in=user_ids)
+        mismatches = 0
+        for user in users.filter(shoppingcarts__isnull=False).distinct():
+            if self.as_set(get_ingredients(user)) != self.as_set(
+                    get_aggregated_ingredients(user)):
+                mismatches += 1
+                self.stdout.write(self.style.ERROR(
+                    f'Список покупок {user} расходится с корзиной'))
+        users_without_cart = users.filter(
+            shoppingcarts__isnull=True, shopping_list__amount__gt=0)
+        for user in users_without_cart.distinct():
+            mismatches += 1
+            self.stdout.write(self.style.ERROR(
+                f'Список покупок {user} не пуст при пустой корзине'))
+        if mismatches:
+            self.stdout.write(self.style.ERROR(
+                f'Расхождений: {mismatches}'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Расхождений нет'))
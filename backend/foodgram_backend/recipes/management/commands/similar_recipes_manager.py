@@ -0,0 +1,14 @@
+from django.core.management import BaseCommand
+
+from api.similar import rebuild_similar_recipes
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds top-k similar recipes by shared ingredients and tags'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        rebuild_similar_recipes(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS('Похожие рецепты пересчитаны'))
@@ -0,0 +1,15 @@
+from django.core.management import BaseCommand
+
+from recipes.models import update_tag_masks
+
+
+class Command(BaseCommand):
+    help = 'Recalculates recipe tag masks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        changed = update_tag_masks(batch_size=options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Маски тегов пересчитаны: {changed}'))
@@ -1,5 +1,6 @@
 from django.core.management import BaseCommand
 
+from api.catalog import bump_catalog_version
 from recipes.models import Tag
 
 
@@ -12,7 +13,9 @@ class Command(BaseCommand):
             {'name': 'Обед', 'color': '#49B64E', 'slug': 'dinner'},
             {'name': 'Ужин', 'color': '#8775D2', 'slug': 'late_dinner'},
         ]
-        Tag.objects.bulk_create(Tag(**tag) for tag in data)
+        Tag.objects.bulk_create(
+            (Tag(**tag) for tag in data), ignore_conflicts=True)
+        bump_catalog_version('tags')
         self.stdout.write(
             self.style.SUCCESS('Тэги загружены')
         )
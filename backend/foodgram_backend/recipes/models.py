@@ -1,8 +1,26 @@
+from collections import defaultdict
+
 from colorfield.fields import ColorField
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
 
 from users.models import User
+from .storage import ContentAddressedStorage
+
+MAX_MASK_TAG_ID = 62
+
+
+def get_tag_mask(tag_ids):
+    """
+    Битовая маска тегов рецепта: тегу с id N соответствует бит N - 1.
+    Теги с id больше MAX_MASK_TAG_ID в маску не попадают.
+    """
+    mask = 0
+    for tag_id in tag_ids:
+        if tag_id <= MAX_MASK_TAG_ID:
+            mask |= 1 << (tag_id - 1)
+    return mask
 
 
 class Tag(models.Model):
@@ -37,6 +55,11 @@ class Ingredient(models.Model):
         ordering = ('-id',)
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit', ),
+                name='unique_ingredient')
+        ]
 
     def __str__(self):
         return self.name
@@ -54,7 +77,12 @@ class Recipe(models.Model):
     text = models.TextField('Описание')
     cooking_time = models.PositiveIntegerField(
         'Длительность приготовления', validators=[MinValueValidator(1)])
-    image = models.ImageField('Картинка', upload_to='recipe', blank=True, )
+    image = models.ImageField(
+        'Картинка', upload_to='recipe', blank=True,
+        storage=ContentAddressedStorage())
+    thumbnail = models.ImageField(
+        'Миниатюра', upload_to='recipe/thumbnails', blank=True,
+        editable=False)
     ingredients = models.ManyToManyField(
         Ingredient,
         through='RecipeIngredient',
@@ -63,6 +91,13 @@ class Recipe(models.Model):
     )
     tags = models.ManyToManyField(
         Tag, related_name='recipes', verbose_name='Теги')
+    tag_mask = models.BigIntegerField(
+        'Маска тегов', default=0, editable=False)
+    search_vector = SearchVectorField(null=True, editable=False)
+    favorites_count = models.PositiveIntegerField(
+        'В избранном', default=0, editable=False)
+    shopping_carts_count = models.PositiveIntegerField(
+        'В корзинах', default=0, editable=False)
 
     class Meta:
         ordering = ('-id', )
@@ -82,6 +117,27 @@ class Recipe(models.Model):
     get_tags.short_description = 'Теги'
 
 
+def update_tag_masks(recipe_ids=None, batch_size=1000):
+    """Пересчитывает битовые маски тегов рецептов."""
+    recipes = Recipe.objects.only('id', 'tag_mask')
+    relations = Recipe.tags.through.objects.all()
+    if recipe_ids is not None:
+        recipes = recipes.filter(id__in=recipe_ids)
+        relations = relations.filter(recipe_id__in=recipe_ids)
+    tag_ids = defaultdict(list)
+    for recipe_id, tag_id in relations.values_list(
+            'recipe_id', 'tag_id').iterator():
+        tag_ids[recipe_id].append(tag_id)
+    changed = []
+    for recipe in recipes.iterator():
+        mask = get_tag_mask(tag_ids[recipe.id])
+        if recipe.tag_mask != mask:
+            recipe.tag_mask = mask
+            changed.append(recipe)
+    Recipe.objects.bulk_update(changed, ('tag_mask', ), batch_size)
+    return len(changed)
+
+
 class RecipeIngredient(models.Model):
     """Класс модели связи между рецептами и ингредиентами."""
     recipe = models.ForeignKey(
@@ -129,6 +185,8 @@ class BaseFavorite(models.Model):
 
 class Favorite(BaseFavorite):
     """Класс модели избранных рецептов."""
+    counter_field = 'favorites_count'
+    viewer_state = 'favorites'
 
     class Meta(BaseFavorite.Meta):
         verbose_name = 'Избранное'
@@ -137,6 +195,9 @@ class Favorite(BaseFavorite):
             models.UniqueConstraint(
                 fields=('user', 'recipe', ), name='unique_favorite')
         ]
+        indexes = [
+            models.Index(fields=('user', '-id', ), name='favorite_user_id_idx')
+        ]
 
     def __str__(self):
         return f'{self.recipe} в избранном у {self.user}.'
@@ -144,6 +205,8 @@ class Favorite(BaseFavorite):
 
 class ShoppingCart(BaseFavorite):
     """Класс модели списка покупок."""
+    counter_field = 'shopping_carts_count'
+    viewer_state = 'shopping_cart'
 
     class Meta(BaseFavorite.Meta):
         verbose_name = 'Корзина'
@@ -152,6 +215,101 @@ class ShoppingCart(BaseFavorite):
             models.UniqueConstraint(
                 fields=('user', 'recipe', ), name='unique_cart')
         ]
+        indexes = [
+            models.Index(fields=('user', '-id', ), name='cart_user_id_idx')
+        ]
 
     def __str__(self):
         return f'{self.recipe} в корзине покупок у {self.user}.'
+
+
+class ShoppingListIngredient(models.Model):
+    """
+    Класс модели суммарного количества ингредиента в списке покупок.
+    Поддерживается приращениями при изменении корзины и рецептов.
+    """
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE,
+        related_name='shopping_list', verbose_name='Пользователь')
+    ingredient = models.ForeignKey(
+        Ingredient, on_delete=models.CASCADE,
+        related_name='shopping_lists', verbose_name='Ингредиент')
+    amount = models.IntegerField('Количество', default=0)
+
+    class Meta:
+        ordering = ('ingredient__name', )
+        verbose_name = 'Ингредиент списка покупок'
+        verbose_name_plural = 'Ингредиенты списков покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'ingredient', ),
+                name='unique_shopping_list_ingredient')
+        ]
+
+    def __str__(self):
+        return f'{self.ingredient} в списке покупок у {self.user}.'
+
+
+class FeedEntry(models.Model):
+    """
+    Класс модели ленты подписок: рецепт автора, на которого подписан
+    пользователь. Заполняется при публикации рецепта и при подписке.
+    """
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE,
+        related_name='feed', verbose_name='Пользователь')
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE,
+        related_name='feed_entries', verbose_name='Рецепт')
+    author = models.ForeignKey(
+        User, on_delete=models.CASCADE,
+        related_name='+', verbose_name='Автор')
+
+    class Meta:
+        ordering = ('-recipe_id', )
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe', ), name='unique_feed_entry')
+        ]
+        indexes = [
+            models.Index(
+                fields=('user', '-recipe', ), name='feed_user_recipe_idx'),
+            models.Index(
+                fields=('user', 'author', ), name='feed_user_author_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} в ленте у {self.user}.'
+
+
+class SimilarRecipe(models.Model):
+    """
+    Класс модели похожего рецепта: для каждого рецепта хранится
+    SIMILAR_RECIPES_COUNT рецептов с наибольшим числом общих
+    ингредиентов и тегов.
+    """
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE,
+        related_name='similar_recipes', verbose_name='Рецепт')
+    similar = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE,
+        related_name='similar_to', verbose_name='Похожий рецепт')
+    score = models.PositiveSmallIntegerField('Сходство')
+
+    class Meta:
+        ordering = ('-score', '-similar_id', )
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('recipe', 'similar', ), name='unique_similar_recipe')
+        ]
+        indexes = [
+            models.Index(
+                fields=('recipe', '-score', ), name='similar_recipe_score_idx')
+        ]
+
+    def __str__(self):
+        return f'{self.similar} похож на {self.recipe}.'
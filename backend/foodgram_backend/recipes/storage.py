@@ -0,0 +1,27 @@
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранилище, сохраняющее файлы под хэшем их содержимого.
+    Повторная загрузка того же файла не создает копию на диске.
+    """
+
+    def _save(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        dirname, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        name = os.path.join(dirname, digest[:2], digest + extension)
+        if self.exists(name):
+            return name
+        return super()._save(name, content)
+
+    def get_available_name(self, name, max_length=None):
+        return name
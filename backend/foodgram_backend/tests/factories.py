@@ -0,0 +1,76 @@
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.relations import add_recipes, add_subscriptions
+from recipes.models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart, Tag)
+from users.models import User
+
+PASSWORD = 'Pa55word-for-tests'
+
+
+def create_tags(count=3):
+    return [
+        Tag.objects.create(
+            name=f'Тег {index}', color=f'#00000{index}', slug=f'tag{index}')
+        for index in range(count)
+    ]
+
+
+def create_ingredients(count=8):
+    return [
+        Ingredient.objects.create(
+            name=f'Ингредиент {index}', measurement_unit='г')
+        for index in range(count)
+    ]
+
+
+def create_users(count=3):
+    return [
+        User.objects.create_user(
+            email=f'user{index}@example.com', username=f'user{index}',
+            first_name='Имя', last_name='Фамилия', password=PASSWORD)
+        for index in range(count)
+    ]
+
+
+def create_recipe(author, name, tags, ingredients, text='Суп с лапшой'):
+    """Рецепт без изображения: ингредиенты берутся с количествами 1, 2..."""
+    recipe = Recipe.objects.create(
+        author=author, name=name, text=text, cooking_time=10)
+    recipe.tags.set(tags)
+    RecipeIngredient.objects.bulk_create([
+        RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=amount)
+        for amount, ingredient in enumerate(ingredients, 1)
+    ])
+    return recipe
+
+
+def create_dataset(recipes=20):
+    """
+    Пользователи, теги, ингредиенты и рецепты с подписками, избранным
+    и корзиной у первого пользователя.
+    """
+    users = create_users()
+    tags = create_tags()
+    ingredients = create_ingredients()
+    for index in range(recipes):
+        create_recipe(
+            users[index % len(users)], f'Рецепт {index}',
+            tags[:1 + index % len(tags)],
+            ingredients[index % 4:index % 4 + 1 + index % 3])
+    user = users[0]
+    add_subscriptions(user, [other.id for other in users[1:]])
+    other_recipes = list(Recipe.objects.exclude(
+        author=user).values_list('id', flat=True))
+    add_recipes(Favorite, user, other_recipes[::2])
+    add_recipes(ShoppingCart, user, other_recipes[::3])
+    return users, tags, ingredients
+
+
+def get_client(user=None):
+    client = APIClient()
+    if user is not None:
+        token, _ = Token.objects.get_or_create(user=user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
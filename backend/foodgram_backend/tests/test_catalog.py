@@ -0,0 +1,51 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from .factories import create_ingredients, create_tags, get_client
+
+
+class CatalogCacheTests(TestCase):
+    """Кэш справочников и ответы 304 по If-None-Match."""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_tags()
+        create_ingredients()
+
+    def setUp(self):
+        cache.clear()
+        self.client = get_client()
+
+    def test_unknown_params_share_entry(self):
+        self.client.get('/api/tags/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/tags/?junk=1&page=5')
+        self.assertEqual(response.status_code, 200)
+
+    def test_search_params_normalized(self):
+        self.client.get('/api/ingredients/?name=ингр')
+        with mock.patch('api.views.ingredient_index.search') as search:
+            response = self.client.get(
+                '/api/ingredients/?name=+ИНГР+&junk=1')
+        search.assert_not_called()
+        self.assertEqual(len(response.data), 8)
+
+    def test_if_none_match(self):
+        etag = self.client.get('/api/tags/')['ETag']
+        cases = {
+            etag: 304,
+            f'"other", {etag}': 304,
+            f'W/{etag}': 304,
+            '*': 304,
+            '"other"': 200,
+            # Подстрока заголовка не должна считаться совпадением.
+            f'"other"x{etag}': 200,
+        }
+        for header, status_code in cases.items():
+            with self.subTest(header=header):
+                response = self.client.get(
+                    '/api/tags/', HTTP_IF_NONE_MATCH=header)
+                self.assertEqual(response.status_code, status_code)
+                self.assertEqual(response['ETag'], etag)
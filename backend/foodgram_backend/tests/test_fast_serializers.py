@@ -0,0 +1,88 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from api.search import ensure_fts_table
+from recipes.models import Recipe
+from .factories import create_dataset, get_client
+
+SERIALIZERS = override_settings(
+    FAST_READ_SERIALIZERS=False, RECIPE_FRAGMENT_CACHE_TIMEOUT=0)
+FAST_PATHS = {
+    'values': override_settings(
+        FAST_READ_SERIALIZERS=True, RECIPE_FRAGMENT_CACHE_TIMEOUT=0),
+    'fragments': override_settings(
+        FAST_READ_SERIALIZERS=True, RECIPE_FRAGMENT_CACHE_TIMEOUT=3600),
+}
+
+
+class FastSerializerParityTests(TestCase):
+    """
+    Быстрый путь отдает те же байты, что и RecipeSerializer:
+    с кэшем фрагментов и без него, для гостя и пользователя.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        # Таблица FTS5 создается вне транзакции теста, иначе ее откат
+        # не заметит отметка о готовности таблицы в api.search.
+        ensure_fts_table(connection)
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        users, tags, _ = create_dataset(recipes=25)
+        cls.user, cls.author = users[:2]
+        cls.tag = tags[1]
+        Recipe.objects.filter(id__in=Recipe.objects.filter(
+            author=cls.author).values('id')).update(
+                image='recipes/images/dish.png',
+                thumbnail='recipes/thumbnails/dish.webp')
+        cls.recipe = Recipe.objects.filter(author=cls.author).first()
+
+    def get_urls(self):
+        return (
+            '/api/recipes/',
+            '/api/recipes/?page=2&limit=4',
+            f'/api/recipes/?tags={self.tag.slug}',
+            f'/api/recipes/?author={self.author.id}',
+            '/api/recipes/?is_favorited=1',
+            '/api/recipes/?is_in_shopping_cart=1',
+            '/api/recipes/?search=рецепт',
+            '/api/recipes/?search=лапш&limit=3',
+            f'/api/recipes/{self.recipe.id}/',
+        )
+
+    def get_content(self, client, url):
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return response.content
+
+    def assertSameContent(self, user):
+        client = get_client(user)
+        for url in self.get_urls():
+            with SERIALIZERS:
+                expected = self.get_content(client, url)
+            for name, fast_path in FAST_PATHS.items():
+                cache.clear()
+                with fast_path:
+                    # Второй запрос берет фрагменты из кэша.
+                    for attempt in ('cold', 'warm'):
+                        with self.subTest(url=url, path=name, cache=attempt):
+                            self.assertEqual(
+                                self.get_content(client, url), expected)
+
+    def test_anonymous(self):
+        self.assertSameContent(None)
+
+    def test_authenticated(self):
+        self.assertSameContent(self.user)
+
+    def test_feed(self):
+        client = get_client(self.user)
+        with SERIALIZERS:
+            expected = self.get_content(client, '/api/recipes/feed/')
+        for name, fast_path in FAST_PATHS.items():
+            with self.subTest(path=name), fast_path:
+                self.assertEqual(
+                    self.get_content(client, '/api/recipes/feed/'), expected)
@@ -0,0 +1,33 @@
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from .factories import create_dataset, get_client
+
+
+class StreamingTimingTests(TestCase):
+    """Запросы потокового ответа учитываются после отдачи тела."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_dataset(recipes=6)[0][0]
+
+    @mock.patch('api.middleware.observe_request')
+    def test_shopping_list(self, observe_request):
+        client = get_client(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/api/recipes/download_shopping_cart/')
+            observe_request.assert_not_called()
+            content = b''.join(response.streaming_content)
+        self.assertTrue(content)
+        observe_request.assert_called_once()
+        view, method, status, total, db_time, count = (
+            observe_request.call_args[0])
+        self.assertEqual(
+            (view, method, status),
+            ('recipe-download-shopping-cart', 'GET', 200))
+        # Выборка списка покупок идет при отдаче тела.
+        self.assertEqual(count, len(queries))
+        self.assertGreater(total, db_time)
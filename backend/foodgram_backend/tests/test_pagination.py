@@ -0,0 +1,39 @@
+from django.db import connection
+from django.test import TestCase
+
+from api.search import ensure_fts_table
+from .factories import (
+    create_ingredients, create_recipe, create_tags, create_users, get_client)
+
+
+class CursorPaginationTests(TestCase):
+    """Параметр cursor не меняет порядок выдачи поиска."""
+
+    @classmethod
+    def setUpClass(cls):
+        ensure_fts_table(connection)
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        author = create_users(1)[0]
+        tags, ingredients = create_tags(1), create_ingredients(1)
+        cls.title = create_recipe(
+            author, 'Суп', tags, ingredients, text='Обед')
+        cls.text = create_recipe(
+            author, 'Каша', tags, ingredients, text='Не суп')
+
+    def get_ids(self, query):
+        response = get_client().get(f'/api/recipes/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_cursor(self):
+        self.assertEqual(
+            self.get_ids('cursor='), [self.text.id, self.title.id])
+
+    def test_cursor_with_search(self):
+        # Совпадение в названии весит больше, чем в описании.
+        expected = [self.title.id, self.text.id]
+        self.assertEqual(self.get_ids('search=суп'), expected)
+        self.assertEqual(self.get_ids('search=суп&cursor='), expected)
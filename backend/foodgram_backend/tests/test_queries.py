@@ -0,0 +1,63 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from .factories import create_dataset, get_client
+
+FRAGMENTS = override_settings(
+    FAST_READ_SERIALIZERS=True, RECIPE_FRAGMENT_CACHE_TIMEOUT=3600)
+
+
+class QueryCountTests(TestCase):
+    """Число запросов к базе не зависит от размера страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_dataset(recipes=20)[0][0]
+
+    def setUp(self):
+        cache.clear()
+
+    def assertQueries(self, client, url, cold, warm):
+        """Первый запрос собирает кэши, повторный берет их готовыми."""
+        for expected in (cold, warm):
+            with self.assertNumQueries(expected):
+                response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+
+    @FRAGMENTS
+    def test_recipes_anonymous(self):
+        for limit in (6, 100):
+            with self.subTest(limit=limit):
+                cache.clear()
+                # count, страница и фрагменты: теги и ингредиенты.
+                self.assertQueries(
+                    get_client(), f'/api/recipes/?limit={limit}', 5, 2)
+
+    @FRAGMENTS
+    def test_recipes_authenticated(self):
+        for limit in (6, 100):
+            with self.subTest(limit=limit):
+                cache.clear()
+                # Плюс токен и три множества состояния пользователя.
+                self.assertQueries(
+                    get_client(self.user), f'/api/recipes/?limit={limit}',
+                    9, 6)
+
+    @override_settings(
+        FAST_READ_SERIALIZERS=False, RECIPE_FRAGMENT_CACHE_TIMEOUT=3600)
+    def test_recipes_serializers(self):
+        for limit in (6, 100):
+            with self.subTest(limit=limit):
+                # Без FAST_READ_SERIALIZERS кэш фрагментов не участвует,
+                # теги и ингредиенты подгружаются prefetch_related.
+                self.assertQueries(
+                    get_client(self.user), f'/api/recipes/?limit={limit}',
+                    8, 8)
+
+    def test_subscriptions(self):
+        for query in ('limit=1&recipes_limit=1', 'limit=100'):
+            with self.subTest(query=query):
+                # Токен, count, подписки с авторами и рецепты авторов.
+                self.assertQueries(
+                    get_client(self.user),
+                    f'/api/users/subscriptions/?{query}', 4, 4)
@@ -0,0 +1,28 @@
+from unittest import mock
+
+from django.db import DEFAULT_DB_ALIAS
+from django.test import SimpleTestCase, override_settings
+from rest_framework.test import APIRequestFactory
+from rest_framework.views import APIView
+
+from api.replicas import ReplicaReadMixin, get_read_alias
+
+
+class FailingView(ReplicaReadMixin, APIView):
+    authentication_classes = ()
+    permission_classes = ()
+
+    def get(self, request):
+        assert get_read_alias() == DEFAULT_DB_ALIAS
+        raise RuntimeError('ошибка представления')
+
+
+@override_settings(REPLICA_DATABASES=[DEFAULT_DB_ALIAS])
+@mock.patch('api.replicas.is_shared_cache', return_value=True)
+class ReplicaReadMixinTests(SimpleTestCase):
+
+    def test_alias_reset_after_unhandled_exception(self, is_shared_cache):
+        request = APIRequestFactory().get('/')
+        with self.assertRaises(RuntimeError):
+            FailingView.as_view()(request)
+        self.assertIsNone(get_read_alias())
@@ -0,0 +1,119 @@
+import random
+import shutil
+import tempfile
+
+from django.test import TransactionTestCase, override_settings
+
+from api.similar import rebuild_similar_recipes
+from recipes.management.commands.generate_data_manager import PIXEL_PNG
+from recipes.models import SimilarRecipe
+from .factories import (
+    create_ingredients, create_recipe, create_tags, create_users, get_client)
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT, IMAGE_PROCESSING_WORKERS=0,
+    SIMILAR_RECIPES_COUNT=3)
+class SimilarRecipesRefreshTests(TransactionTestCase):
+    """
+    Соседи после создания и изменения рецепта через API совпадают
+    с полным пересчетом. Обновление идет после фиксации транзакции,
+    поэтому тесты работают без общей транзакции TestCase.
+    """
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.user = create_users(1)[0]
+        self.client = get_client(self.user)
+        self.tags = create_tags(2)
+        self.ingredients = create_ingredients(10)
+
+    def get_data(self, ingredients, tags=None):
+        return {
+            'name': 'Рецепт', 'text': 'Описание', 'cooking_time': 5,
+            'image': 'data:image/png;base64,' + PIXEL_PNG,
+            'tags': [tag.id for tag in tags or self.tags[:1]],
+            'ingredients': [
+                {'id': ingredient.id, 'amount': 1}
+                for ingredient in ingredients],
+        }
+
+    def create(self, ingredients, tags=None):
+        response = self.client.post(
+            '/api/recipes/', self.get_data(ingredients, tags), format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.data['id']
+
+    def update(self, recipe_id, ingredients, tags=None):
+        response = self.client.patch(
+            f'/api/recipes/{recipe_id}/', self.get_data(ingredients, tags),
+            format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+
+    def get_similar(self):
+        return set(SimilarRecipe.objects.values_list(
+            'recipe_id', 'similar_id', 'score'))
+
+    def assertSameAsRebuild(self, message=''):
+        refreshed = self.get_similar()
+        rebuild_similar_recipes()
+        self.assertEqual(refreshed, self.get_similar(), message)
+
+    def test_recipe_enters_list_of_distant_candidate(self):
+        """
+        Рецепт с одним общим ингредиентом не попадает в соседи нового
+        рецепта, но новый рецепт должен появиться в его неполном списке
+        и не пропасть оттуда при изменении тегов.
+        """
+        common, rare = self.ingredients[:6], self.ingredients[9]
+        for _ in range(4):
+            create_recipe(self.user, 'Похожий', self.tags[:1], common)
+        distant = create_recipe(self.user, 'Далекий', self.tags[1:], [rare])
+        rebuild_similar_recipes()
+        recipe_id = self.create(common + [rare])
+        self.assertIn(
+            (distant.id, recipe_id, 1), self.get_similar())
+        self.assertSameAsRebuild('создание')
+        self.update(recipe_id, common + [rare], self.tags)
+        self.assertIn(
+            (distant.id, recipe_id, 2), self.get_similar())
+        self.assertSameAsRebuild('изменение тегов')
+        self.update(recipe_id, common)
+        self.assertSameAsRebuild('удаление общего ингредиента')
+
+    def test_recipe_falls_out_of_full_list(self):
+        """Место ослабевшего соседа в полном списке занимает следующий."""
+        recipe_ids = [
+            self.create(self.ingredients[:count])
+            for count in (2, 3, 4, 5, 1)
+        ]
+        self.assertSameAsRebuild('создание')
+        self.update(recipe_ids[3], self.ingredients[8:9])
+        self.assertSameAsRebuild('изменение')
+        self.client.delete(f'/api/recipes/{recipe_ids[2]}/')
+        self.assertSameAsRebuild('удаление')
+
+    def test_random_changes(self):
+        generator = random.Random(42)
+        recipe_ids = []
+        for step in range(40):
+            ingredients = generator.sample(
+                self.ingredients, generator.randint(1, 4))
+            tags = generator.sample(self.tags, generator.randint(1, 2))
+            action = generator.random()
+            if len(recipe_ids) < 5 or action < 0.4:
+                recipe_ids.append(self.create(ingredients, tags))
+            elif action < 0.9:
+                self.update(
+                    generator.choice(recipe_ids), ingredients, tags)
+            else:
+                recipe_id = recipe_ids.pop(
+                    generator.randrange(len(recipe_ids)))
+                self.client.delete(f'/api/recipes/{recipe_id}/')
+            self.assertSameAsRebuild(f'шаг {step}')
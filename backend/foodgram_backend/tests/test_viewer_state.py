@@ -0,0 +1,62 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from api.viewer_state import get_state_key
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Subscription
+from .factories import create_dataset, get_client
+
+
+@mock.patch('api.viewer_state.is_shared_cache', return_value=True)
+class ViewerStateTests(TestCase):
+    """
+    Отметки пользователя и счетчики не устаревают при изменениях
+    в обход API: через ORM, админку и каскадное удаление.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        users, _, _ = create_dataset(recipes=6)
+        cls.user, cls.author = users[:2]
+        cls.recipe = Recipe.objects.filter(author=cls.author).first()
+
+    def setUp(self):
+        cache.clear()
+        self.client = get_client(self.user)
+
+    def get_recipe(self):
+        return self.client.get(f'/api/recipes/{self.recipe.id}/').data
+
+    def test_favorite_changed_through_orm(self, is_shared_cache):
+        self.get_recipe()
+        self.assertIsNotNone(
+            cache.get(get_state_key(self.user.id, 'favorites')))
+        Favorite.objects.filter(user=self.user).delete()
+        self.assertIsNone(cache.get(get_state_key(self.user.id, 'favorites')))
+        self.assertFalse(self.get_recipe()['is_favorited'])
+        Favorite.objects.create(user=self.user, recipe=self.recipe)
+        data = self.get_recipe()
+        self.assertTrue(data['is_favorited'])
+        self.assertEqual(data['favorites_count'], 1)
+        Favorite.objects.filter(user=self.user, recipe=self.recipe).delete()
+        data = self.get_recipe()
+        self.assertFalse(data['is_favorited'])
+        self.assertEqual(data['favorites_count'], 0)
+
+    def test_cart_emptied_by_recipe_cascade(self, is_shared_cache):
+        ShoppingCart.objects.get_or_create(user=self.user, recipe=self.recipe)
+        self.assertTrue(self.get_recipe()['is_in_shopping_cart'])
+        key = get_state_key(self.user.id, 'shopping_cart')
+        self.assertIn(self.recipe.id, cache.get(key))
+        Recipe.objects.filter(id=self.recipe.id).delete()
+        self.assertIsNone(cache.get(key))
+
+    def test_subscription_changed_through_orm(self, is_shared_cache):
+        self.assertTrue(self.get_recipe()['author']['is_subscribed'])
+        Subscription.objects.filter(
+            user=self.user, author=self.author).delete()
+        author = self.get_recipe()['author']
+        self.assertFalse(author['is_subscribed'])
+        self.assertEqual(author['subscribers_count'], 0)
@@ -7,6 +7,10 @@ class User(AbstractUser):
     USERNAME_FIELD = 'email'
     email = models.EmailField('Email', max_length=255, unique=True)
     REQUIRED_FIELDS = ('username', )
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов', default=0, editable=False)
+    subscribers_count = models.PositiveIntegerField(
+        'Количество подписчиков', default=0, editable=False)
 
     class Meta:
         ordering = ('username',)
@@ -19,6 +23,7 @@ class User(AbstractUser):
 
 class Subscription(models.Model):
     """Класс модели подписок."""
+    viewer_state = 'subscriptions'
     user = models.ForeignKey(
         User,
         related_name='subscriber',
@@ -45,6 +50,10 @@ class Subscription(models.Model):
                 name='prevent_self_subscription'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=('user', '-id', ), name='subscription_user_id_idx')
+        ]
 
     DESCRIPTION = '{subscriber} подписан на {subscribing}.'
 